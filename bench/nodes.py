@@ -0,0 +1,42 @@
+#!/usr/bin/python3
+#coding: utf-8
+
+"""LazyObject's memory and construction rate benchmark.
+
+Usage: python3 nodes.py [count]
+"""
+
+import sys
+sys.path.insert(0, "..")
+
+import time
+import tracemalloc
+import evalcache
+
+def build(lazy, count):
+	x = lazy(1)
+	nodes = []
+	for i in range(count):
+		x = x + i
+		nodes.append(x)
+	return nodes
+
+def main(count = 100000):
+	lazy = evalcache.Lazy(cache = {})
+
+	start = time.perf_counter()
+	build(lazy, count)
+	elapsed = time.perf_counter() - start
+
+	tracemalloc.start()
+	before = tracemalloc.get_traced_memory()[0]
+	nodes = build(lazy, count)
+	after = tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+
+	print("nodes: {}".format(count))
+	print("construction rate: {:.0f} nodes/s".format(count / elapsed))
+	print("bytes per node: {:.1f}".format((after - before) / count))
+
+if __name__ == "__main__":
+	main(*[int(a) for a in sys.argv[1:]])
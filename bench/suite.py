@@ -0,0 +1,190 @@
+#!/usr/bin/python3
+#coding: utf-8
+
+"""Benchmark suite of evalcache hot paths. Results are printed as JSON.
+
+Benchmarks:
+construction -- LazyObject construction rate (nodes/s)
+updatehash -- hashing throughput of large flat and nested arguments
+unlazy -- evaluation overhead per node for wide and deep trees (without cache and with dict cache)
+	and time of tree rebuilding with root found in cache
+dircache -- DirCache store and load latency by entries count. "cold" is the first load of an entry
+	by fresh DirCache object, "warm" is repeated load (OS file cache isn't dropped).
+
+Usage:
+python3 suite.py [--quick] [--entries 1000,10000,...] [--output FILE] [--compare BASE.json [--threshold 0.2]]
+
+With --compare exit status is 1 if some metric is worse than in base results more than by threshold.
+"""
+
+import sys
+sys.path.insert(0, "..")
+
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import platform
+import tempfile
+
+import evalcache
+
+def best(func, repeat):
+	"""Best of repeated runs in seconds."""
+	result = None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		func()
+		elapsed = time.perf_counter() - start
+		result = elapsed if result is None else min(result, elapsed)
+	return result
+
+def bench_construction(count, repeat):
+	lazy = evalcache.Lazy(cache = {})
+	def build():
+		x = lazy(1)
+		for i in range(count):
+			x = x + i
+	return { "nodes_per_s": count / best(build, repeat) }
+
+def bench_updatehash(count, repeat):
+	flat = list(range(count))
+	nested = [ { "key": i, "values": [i, (i, str(i))] } for i in range(count // 10) ]
+	blob = bytes(count * 100)
+	result = {}
+	for name, arg in (("flat", flat), ("nested", nested), ("bytes", blob)):
+		def run():
+			evalcache.updatehash(hashlib.sha256(), arg)
+		result[name + "_s"] = best(run, repeat)
+	return result
+
+def wide(lazy, count):
+	add = lazy(lambda a, b: a + b)
+	return lazy(sum)([ add(i, 1) for i in range(count) ])
+
+def deep(lazy, count):
+	x = lazy(0)
+	for i in range(count):
+		x = x + 1
+	return x
+
+def bench_unlazy(count, repeat):
+	result = {}
+	for shape, build in (("wide", wide), ("deep", deep)):
+		for mode in ("nocache", "dict"):
+			def run():
+				if mode == "nocache":
+					lazy = evalcache.Lazy(cache = {}, encache = False, decache = False)
+				else:
+					lazy = evalcache.Lazy(cache = {})
+				build(lazy, count).unlazy()
+			result["{}_{}_us_per_node".format(shape, mode)] = best(run, repeat) / count * 1e6
+
+		cache = {}
+		build(evalcache.Lazy(cache = cache), count).unlazy()
+		def warm():
+			build(evalcache.Lazy(cache = cache), count).unlazy()
+		result["{}_rebuild_hit_us".format(shape)] = best(warm, repeat) * 1e6
+	return result
+
+def bench_dircache(entries, repeat):
+	result = {}
+	value = list(range(100))
+	for count in entries:
+		dirpath = tempfile.mkdtemp(prefix = "evalcache-bench-")
+		try:
+			cache = evalcache.DirCache(dirpath)
+			keys = [ hashlib.sha256(str(i).encode()).hexdigest() for i in range(count) ]
+
+			start = time.perf_counter()
+			for key in keys:
+				cache[key] = value
+			store = time.perf_counter() - start
+
+			sample = keys[:: max(1, count // 1000)]
+			cache = evalcache.DirCache(dirpath)
+			start = time.perf_counter()
+			for key in sample:
+				cache[key]
+			cold = time.perf_counter() - start
+
+			def warm():
+				for key in sample:
+					if key in cache:
+						cache[key]
+			warm = best(warm, repeat)
+
+			result[str(count)] = {
+				"store_us": store / count * 1e6,
+				"cold_load_us": cold / len(sample) * 1e6,
+				"warm_load_us": warm / len(sample) * 1e6,
+			}
+		finally:
+			shutil.rmtree(dirpath)
+	return result
+
+def flatten(results, prefix = ""):
+	"""Metrics as dict: dotted path -> number."""
+	out = {}
+	for key, value in results.items():
+		if isinstance(value, dict):
+			out.update(flatten(value, prefix + key + "."))
+		elif isinstance(value, (int, float)):
+			out[prefix + key] = value
+	return out
+
+def compare(results, base, threshold):
+	"""Metrics worse than base by threshold. Rates (per_s) are better bigger, times are better smaller."""
+	current = flatten(results["benchmarks"])
+	regressions = []
+	for key, old in flatten(base["benchmarks"]).items():
+		new = current.get(key)
+		if new is None or old <= 0:
+			continue
+		ratio = old / new if key.endswith("per_s") else new / old
+		if ratio > 1 + threshold:
+			regressions.append({ "metric": key, "base": old, "current": new, "ratio": ratio })
+	return regressions
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = "evalcache benchmark suite")
+	parser.add_argument("--quick", action = "store_true", help = "small sizes for smoke run")
+	parser.add_argument("--entries", help = "comma separated DirCache sizes (default 1000,10000)")
+	parser.add_argument("--repeat", type = int, default = 3)
+	parser.add_argument("--output", help = "JSON file (default stdout)")
+	parser.add_argument("--compare", help = "base JSON results")
+	parser.add_argument("--threshold", type = float, default = 0.2)
+	args = parser.parse_args(argv)
+
+	count = 1000 if args.quick else 20000
+	entries = [ int(n) for n in args.entries.split(",") ] if args.entries else ([100] if args.quick else [1000, 10000])
+
+	results = {
+		"version": evalcache.__version__,
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"time": time.time(),
+		"benchmarks": {
+			"construction": bench_construction(count * 5, args.repeat),
+			"updatehash": bench_updatehash(count * 5, args.repeat),
+			"unlazy": bench_unlazy(count, args.repeat),
+			"dircache": bench_dircache(entries, args.repeat),
+		}
+	}
+
+	if args.compare:
+		with open(args.compare) as fl:
+			results["regressions"] = compare(results, json.load(fl), args.threshold)
+
+	text = json.dumps(results, indent = 2)
+	if args.output:
+		with open(args.output, "w") as fl:
+			fl.write(text)
+	else:
+		print(text)
+
+	return 1 if results.get("regressions") else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -1,6 +1,57 @@
 #coding: utf-8
 
-from evalcache.dircache import DirCache 
-from evalcache.lazy import Lazy, LazyObject, unlazy, encache, decache, print_tree
+"""Package's names are imported on first access (PEP 562), so 'import evalcache' doesn't
+load asyncio, http, sqlite3, multiprocessing and other modules of unused backends."""
 
-__version__ = "0.3.7"
\ No newline at end of file
+import importlib
+
+__version__ = "0.3.7"
+
+## Exported name -> module.
+exports = {
+	"DirCache": "evalcache.dircache",
+	"PickleCodec": "evalcache.codec",
+	"BufferCodec": "evalcache.codec",
+	"ZlibCodec": "evalcache.codec",
+	"LzmaCodec": "evalcache.codec",
+	"ZstdCodec": "evalcache.codec",
+	"Lz4Codec": "evalcache.codec",
+	"MemoryCache": "evalcache.memcache",
+	"ChainCache": "evalcache.memcache",
+	"TieredCache": "evalcache.memcache",
+	"SqliteCache": "evalcache.sqlitecache",
+	"HttpCache": "evalcache.httpcache",
+	"CacheServer": "evalcache.httpcache",
+	"PackCache": "evalcache.pack",
+	"Lazy": "evalcache.lazy",
+	"LazyObject": "evalcache.lazy",
+	"unlazy": "evalcache.lazy",
+	"encache": "evalcache.lazy",
+	"decache": "evalcache.lazy",
+	"print_tree": "evalcache.lazy",
+	"updatehash": "evalcache.hashing",
+	"register_hash": "evalcache.hashing",
+	"EvalcacheWarning": "evalcache.hashing",
+	"aunlazy": "evalcache.aio",
+	"AsyncCache": "evalcache.aio",
+	"Profiler": "evalcache.instrument",
+	"AdaptivePolicy": "evalcache.policy",
+	"Cluster": "evalcache.distributed",
+	"Worker": "evalcache.distributed",
+	"run_worker": "evalcache.distributed",
+	"DependencyIndex": "evalcache.depindex",
+	"prefetch": "evalcache.depindex",
+}
+
+__all__ = list(exports)
+
+def __getattr__(name):
+	module = exports.get(name)
+	if module is None:
+		raise AttributeError("module 'evalcache' has no attribute '{}'".format(name))
+	value = getattr(importlib.import_module(module), name)
+	globals()[name] = value
+	return value
+
+def __dir__():
+	return sorted(set(globals()) | set(exports))
@@ -0,0 +1,26 @@
+#coding: utf-8
+
+"""evalcache command line tool.
+
+evalcache pack PACKPATH DIRPATH [--keys FILE] -- append DirCache entries to pack file
+evalcache unpack PACKPATH DIRPATH -- copy pack entries to DirCache
+evalcache list PACKPATH -- print keys of pack
+evalcache serve DIRPATH [--host HOST] [--port PORT] -- run shared cache server
+evalcache worker HOST:PORT (--dir DIRPATH | --url URL) [--authkey KEY] -- run cluster's worker
+"""
+
+import sys
+
+def main(argv = None):
+	argv = sys.argv[1:] if argv is None else argv
+	if argv and argv[0] == "serve":
+		from evalcache.httpcache import main as serve
+		return serve(argv[1:])
+	if argv and argv[0] == "worker":
+		from evalcache.distributed import main as worker
+		return worker(argv[1:])
+	from evalcache.pack import main as pack
+	return pack(argv)
+
+if __name__ == "__main__":
+	main()
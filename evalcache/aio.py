@@ -0,0 +1,131 @@
+#coding: utf-8
+
+"""asyncio-native evaluation of lazy trees.
+
+Coroutine-function generics are awaited, sync generics are performed in executor
+(lazifier's executor or loop's default). Independent arguments are evaluated concurrently.
+Concurrent requests of the same node share one in-flight task.
+
+Cache is accessed with async protocol: acontains(key), aget(key), aset(key, value).
+Sync dict-like caches are adapted with AsyncCache.
+"""
+
+import time
+import asyncio
+import inspect
+import functools
+
+from evalcache.lazy import lazyitems, substitute, lazyrelease, diag, emit, pickled_size
+
+class AsyncCache:
+	"""Async protocol adapter for sync dict-like cache (f.e. DirCache). Operations are performed in executor.
+
+	Arguments:
+	----------
+	cache -- dict-like object
+	executor -- concurrent.futures-like executor (None - loop's default executor)
+	"""
+
+	def __init__(self, cache, executor = None):
+		self.cache = cache
+		self.executor = executor
+
+	def run(self, func, *args):
+		return asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+	async def acontains(self, key):
+		return await self.run(self.cache.__contains__, key)
+
+	async def aget(self, key):
+		return await self.run(self.cache.__getitem__, key)
+
+	async def aset(self, key, value):
+		return await self.run(self.cache.__setitem__, key, value)
+
+def asynccache(cache):
+	"""Cache with async protocol."""
+	return cache if hasattr(cache, "aget") else AsyncCache(cache)
+
+## In-flight evaluations by (loop, hash).
+inflight = {}
+
+async def aunlazy(obj):
+	"""Get a result of evaluation in asyncio event loop.
+
+	Same as evalcache.unlazy, but doesn't block event loop.
+	"""
+	if obj.__lazyvalue__ is not None:
+		diag(obj, 'endp' if obj.generic is None else 'fget')
+		return lazyrelease(obj)
+
+	loop = asyncio.get_running_loop()
+	key = (loop, obj.__lazyhash__)
+	task = inflight.get(key)
+	if task is None:
+		task = loop.create_task(aevaluate(obj))
+		inflight[key] = task
+		task.add_done_callback(lambda _: inflight.pop(key, None))
+
+	# Shield shared task from cancellation of one of its waiters.
+	obj.__lazyvalue__ = await asyncio.shield(task)
+	return lazyrelease(obj)
+
+async def aexpand(arg):
+	"""Async version of .expand. Lazy objects are evaluated concurrently. 
+	Containers are converted as in .expand (tuples become lists)."""
+	lazies = lazyitems(arg)
+	values = await asyncio.gather(*[ aunlazy(o) for o in lazies ])
+	return substitute(arg, { id(o) : v for o, v in zip(lazies, values) })
+
+async def aevaluate(obj):
+	"""Load node's value from cache or evaluate it. Lazifier's policy and hooks are used
+	as in lazyload and lazysave."""
+	lazifier = obj.__lazybase__
+	policy = lazifier.policy
+	cache = asynccache(lazifier.cache)
+	key = obj.__lazyhexhash__
+
+	if obj.__decache__ and (policy is None or policy.cached(obj)):
+		start = time.perf_counter()
+		found = await cache.acontains(key)
+		emit(obj, "lookup", start, time.perf_counter() - start, hit = found)
+		if found:
+			diag(obj, 'load')
+			start = time.perf_counter()
+			result = await cache.aget(key)
+			duration = time.perf_counter() - start
+			emit(obj, "load", start, duration)
+			if policy is not None:
+				policy.record(obj, "load", duration)
+			return result
+
+	func, args, kwargs = await aexpand([obj.generic, obj.args, obj.kwargs])
+	start = time.perf_counter()
+	if inspect.iscoroutinefunction(func):
+		result = await func(*args, **kwargs)
+	else:
+		result = await asyncio.get_running_loop().run_in_executor(lazifier.executor,
+			functools.partial(func, *args, **kwargs))
+	result = await aexpand(result)
+	cost = time.perf_counter() - start
+	if lazifier.index is not None:
+		lazifier.index.record(obj)
+	emit(obj, "eval", start, cost)
+	if policy is not None:
+		policy.record(obj, "eval", cost)
+
+	if obj.__encache__ and (policy is None or policy.cached(obj)):
+		diag(obj, 'save')
+		start = time.perf_counter()
+		await cache.aset(key, result)
+		duration = time.perf_counter() - start
+		if lazifier.hooks:
+			emit(obj, "store", start, duration, size = pickled_size(result))
+		if policy is not None:
+			policy.record(obj, "store", duration, result)
+		setcost = getattr(lazifier.cache, "setcost", None)
+		if setcost is not None:
+			await AsyncCache(lazifier.cache).run(setcost, key, cost)
+	else:
+		diag(obj, 'eval')
+	return result
@@ -0,0 +1,250 @@
+#coding: utf-8
+
+"""Serialization formats of cache entries.
+
+Entry, written by codec, begins with header: MAGIC and codec's identifier byte.
+Entries without header are plain pickle files (format of early versions).
+"""
+
+import io
+import mmap
+import lzma
+import zlib
+import pickle
+import struct
+
+try:
+	import zstandard
+except ImportError:
+	zstandard = None
+
+try:
+	import lz4.frame
+except ImportError:
+	lz4 = None
+
+MAGIC = b"EVC"
+
+def header(ident):
+	return MAGIC + bytes((ident,))
+
+class PickleCodec:
+	"""Plain pickle serialization.
+
+	Arguments:
+	----------
+	protocol -- pickle protocol
+	"""
+
+	ident = 0
+
+	def __init__(self, protocol = pickle.DEFAULT_PROTOCOL):
+		self.protocol = protocol
+
+	def dump(self, value, fl):
+		fl.write(header(self.ident))
+		pickle.dump(value, fl, protocol = self.protocol)
+
+	def load(self, fl):
+		return pickle.load(fl)
+
+class BufferCodec:
+	"""Zero-copy serialization for buffer-protocol objects (f.e. numpy arrays).
+
+	Uses pickle protocol 5 out-of-band buffers. Buffers are stored aligned after pickle data.
+	Header contains buffers' offsets (from the entry's start) and lengths, so entry is readable
+	whatever alignment was used by writer and wherever the entry is placed (f.e. in pack file).
+	On load file is memory-mapped, and buffers are passed to unpickler as read-only memoryviews,
+	so numpy arrays are restored without copying and pages are loaded on first touch.
+	Processes which load the same entry share the page cache.
+
+	Loaded arrays are read-only. Codec works with real files only (DirCache).
+
+	Arguments:
+	----------
+	align -- buffers alignment in file.
+	"""
+
+	ident = 1
+	layout = struct.Struct("<QI")
+	span = struct.Struct("<QQ")
+
+	def __init__(self, align = 64):
+		self.align = align
+
+	def dump(self, value, fl):
+		buffers = []
+		data = pickle.dumps(value, protocol = 5, buffer_callback = buffers.append)
+		buffers = [ b.raw() for b in buffers ]
+
+		start = fl.tell()
+		pos = start + len(MAGIC) + 1 + self.layout.size + len(buffers) * self.span.size + len(data)
+		offsets = []
+		for b in buffers:
+			pos += -pos % self.align
+			offsets.append(pos - start)
+			pos += b.nbytes
+
+		fl.write(header(self.ident))
+		fl.write(self.layout.pack(len(data), len(buffers)))
+		for offset, b in zip(offsets, buffers):
+			fl.write(self.span.pack(offset, b.nbytes))
+		fl.write(data)
+		for offset, b in zip(offsets, buffers):
+			fl.write(b"\0" * (start + offset - fl.tell()))
+			fl.write(b)
+
+	def load(self, fl):
+		mm = mmap.mmap(fl.fileno(), 0, access = mmap.ACCESS_READ)
+		view = memoryview(mm)
+
+		pos = fl.tell()
+		start = pos - len(MAGIC) - 1
+		size, count = self.layout.unpack_from(mm, pos)
+		pos += self.layout.size
+		spans = [ self.span.unpack_from(mm, pos + i * self.span.size) for i in range(count) ]
+		pos += count * self.span.size
+
+		data = mm[pos : pos + size]
+		buffers = [ view[start + offset : start + offset + n] for offset, n in spans ]
+		return pickle.loads(data, buffers = buffers)
+
+class CompressCodec:
+	"""Base class of pickle serialization with compression.
+
+	In adaptive mode small values (less than threshold) and incompressible values
+	(compressed size is greater than ratio * size) are stored as plain pickle entries.
+
+	Arguments:
+	----------
+	protocol -- pickle protocol
+	level -- compression level (None - compressor's default)
+	adaptive -- enable adaptive mode
+	threshold -- minimal pickled size for compression in adaptive mode
+	ratio -- maximal compression ratio for storing compressed in adaptive mode
+	"""
+
+	ident = None
+
+	def __init__(self, protocol = pickle.DEFAULT_PROTOCOL, level = None, adaptive = True, threshold = 512, ratio = 0.9):
+		self.protocol = protocol
+		self.level = level
+		self.adaptive = adaptive
+		self.threshold = threshold
+		self.ratio = ratio
+
+	def dump(self, value, fl):
+		data = pickle.dumps(value, protocol = self.protocol)
+		if not self.adaptive or len(data) >= self.threshold:
+			packed = self.compress(data)
+			if not self.adaptive or len(packed) <= self.ratio * len(data):
+				fl.write(header(self.ident))
+				fl.write(packed)
+				return
+
+		fl.write(header(PickleCodec.ident))
+		fl.write(data)
+
+	def load(self, fl):
+		return pickle.loads(self.decompress(fl.read()))
+
+class ZlibCodec(CompressCodec):
+	"""zlib compression (see CompressCodec)."""
+
+	ident = 2
+
+	def compress(self, data):
+		return zlib.compress(data, -1 if self.level is None else self.level)
+
+	def decompress(self, data):
+		return zlib.decompress(data)
+
+class LzmaCodec(CompressCodec):
+	"""lzma compression (see CompressCodec). Slow, but strong."""
+
+	ident = 3
+
+	def compress(self, data):
+		return lzma.compress(data, preset = self.level)
+
+	def decompress(self, data):
+		return lzma.decompress(data)
+
+class ZstdCodec(CompressCodec):
+	"""zstd compression (see CompressCodec). Requires zstandard package."""
+
+	ident = 4
+
+	def __init__(self, *args, **kwargs):
+		if zstandard is None:
+			raise ImportError("ZstdCodec requires zstandard package")
+		CompressCodec.__init__(self, *args, **kwargs)
+
+	def compress(self, data):
+		return zstandard.ZstdCompressor(level = 3 if self.level is None else self.level).compress(data)
+
+	def decompress(self, data):
+		return zstandard.ZstdDecompressor().decompress(data)
+
+class Lz4Codec(CompressCodec):
+	"""lz4 compression (see CompressCodec). Very fast. Requires lz4 package."""
+
+	ident = 5
+
+	def __init__(self, *args, **kwargs):
+		if lz4 is None:
+			raise ImportError("Lz4Codec requires lz4 package")
+		CompressCodec.__init__(self, *args, **kwargs)
+
+	def compress(self, data):
+		return lz4.frame.compress(data, compression_level = 0 if self.level is None else self.level)
+
+	def decompress(self, data):
+		return lz4.frame.decompress(data)
+
+## Table of codecs by identifier.
+codecs = {
+	PickleCodec.ident: PickleCodec,
+	BufferCodec.ident: BufferCodec,
+	ZlibCodec.ident: ZlibCodec,
+	LzmaCodec.ident: LzmaCodec,
+	ZstdCodec.ident: ZstdCodec,
+	Lz4Codec.ident: Lz4Codec,
+}
+
+## Identifiers of codecs, which map files on loading.
+mapped = (BufferCodec.ident,)
+
+## Codecs instances for entries loading.
+decoders = {}
+
+def decoder(ident):
+	if ident not in decoders:
+		decoders[ident] = codecs[ident]()
+	return decoders[ident]
+
+def dump_entry(value, fl, codec = None):
+	"""Write entry to file. If codec is None, plain pickle without header is written."""
+	if codec is None:
+		pickle.dump(value, fl)
+		return
+	codec.dump(value, fl)
+
+def load_entry(fl):
+	"""Read entry from file. Codec is choosed by header."""
+	start = fl.tell()
+	head = fl.read(len(MAGIC) + 1)
+	if len(head) == len(MAGIC) + 1 and head[:len(MAGIC)] == MAGIC:
+		return decoder(head[-1]).load(fl)
+	fl.seek(start)
+	return pickle.load(fl)
+
+def dumps_entry(value, codec = None):
+	"""Serialize entry to bytes (see dump_entry)."""
+	fl = io.BytesIO()
+	dump_entry(value, fl, codec)
+	return fl.getvalue()
+
+def loads_entry(data):
+	"""Deserialize entry from bytes (see load_entry)."""
+	return load_entry(io.BytesIO(data))
@@ -0,0 +1,204 @@
+#coding: utf-8
+
+"""Dependency index for incremental re-evaluation.
+
+Lazifier with index records edges of evaluated nodes (child's key -> parent's key) and
+qualname of node's generic. Index is stored in sqlite3 database file, so it persists across runs
+and can be shared between processes.
+
+lazy = evalcache.Lazy(cache, index = evalcache.DependencyIndex(".evalcache-index.sqlite"))
+
+Then:
+index.affected(keys) -- keys of nodes which depend on given nodes (f.e. changed endpoints).
+index.invalidate(cache, keys) -- remove stale subgraph from cache and index.
+prefetch(roots) -- load all cached nodes of new trees by one bulk read.
+"""
+
+import sqlite3
+import threading
+import contextlib
+
+from evalcache.lazy import LazyObject, genericname, dependencies
+from evalcache.vector import get_many
+
+class DependencyIndex:
+	"""Persistent index of lazy trees edges.
+
+	Records of unlazy pass are buffered and committed by short transactions at the end of pass
+	and after every 'flushsize' records (see batch), so index isn't locked during evaluation.
+
+	Arguments:
+	----------
+	path - database file path.
+	timeout - seconds to wait for database lock.
+	flushsize - count of buffered records which are committed inside batch.
+	"""
+
+	chunk = 500
+
+	def __init__(self, path, timeout = 60, flushsize = 1000):
+		self.path = path
+		self.flushsize = flushsize
+		self.mutex = threading.RLock()
+		self.depth = 0
+		# Buffered records of batch.
+		self.nodes = {}
+		self.edges = set()
+
+		self.connection = sqlite3.connect(path, timeout = timeout, check_same_thread = False,
+			isolation_level = None)
+		self.connection.execute("PRAGMA journal_mode=WAL")
+		self.connection.execute("PRAGMA synchronous=NORMAL")
+		self.connection.execute("CREATE TABLE IF NOT EXISTS nodes (key TEXT PRIMARY KEY, name TEXT NOT NULL)")
+		self.connection.execute("CREATE TABLE IF NOT EXISTS edges (child TEXT NOT NULL, parent TEXT NOT NULL, "
+			"PRIMARY KEY (child, parent)) WITHOUT ROWID")
+
+	@contextlib.contextmanager
+	def batch(self):
+		"""Buffer records and commit them at once. Nested batches are joined to outer."""
+		with self.mutex:
+			self.depth += 1
+		try:
+			yield self
+		finally:
+			with self.mutex:
+				self.depth -= 1
+				if self.depth == 0:
+					self.flush()
+
+	@contextlib.contextmanager
+	def transaction(self):
+		with self.mutex:
+			self.connection.execute("BEGIN IMMEDIATE")
+			try:
+				yield self.connection
+			except BaseException:
+				self.connection.execute("ROLLBACK")
+				raise
+			self.connection.execute("COMMIT")
+
+	def flush(self):
+		"""Commit buffered records in one transaction."""
+		with self.mutex:
+			if not self.nodes and not self.edges:
+				return
+			with self.transaction() as connection:
+				connection.executemany("INSERT OR REPLACE INTO nodes (key, name) VALUES (?, ?)", self.nodes.items())
+				connection.executemany("INSERT OR IGNORE INTO edges (child, parent) VALUES (?, ?)", self.edges)
+			self.nodes.clear()
+			self.edges.clear()
+
+	def record(self, obj):
+		"""Record node and edges from its dependencies."""
+		key = obj.__lazyhexhash__
+		with self.mutex:
+			self.nodes[key] = genericname(obj)
+			for dep in dependencies(obj):
+				self.nodes[dep.__lazyhexhash__] = genericname(dep)
+				self.edges.add((dep.__lazyhexhash__, key))
+			if self.depth == 0 or len(self.nodes) + len(self.edges) >= self.flushsize:
+				self.flush()
+
+	def name(self, key):
+		"""Recorded qualname of node's generic or None."""
+		with self.mutex:
+			self.flush()
+			row = self.connection.execute("SELECT name FROM nodes WHERE key = ?", (hexkey(key),)).fetchone()
+		return row[0] if row is not None else None
+
+	def parents(self, keys):
+		"""Keys of nodes, which directly depend on given nodes."""
+		keys = [ hexkey(k) for k in keys ]
+		result = set()
+		with self.mutex:
+			self.flush()
+			for i in range(0, len(keys), self.chunk):
+				part = keys[i : i + self.chunk]
+				cursor = self.connection.execute(
+					"SELECT parent FROM edges WHERE child IN ({})".format(",".join("?" * len(part))), part)
+				result.update(row[0] for row in cursor)
+		return result
+
+	def children(self, key):
+		"""Keys of node's recorded dependencies."""
+		with self.mutex:
+			self.flush()
+			cursor = self.connection.execute("SELECT child FROM edges WHERE parent = ?", (hexkey(key),))
+			return set(row[0] for row in cursor)
+
+	def affected(self, keys):
+		"""Keys of all nodes, which transitively depend on given nodes (lazy objects or hex keys).
+		Given nodes are not included."""
+		result = set()
+		front = set(hexkey(k) for k in keys)
+		while front:
+			front = self.parents(front) - result
+			result.update(front)
+		return result
+
+	def invalidate(self, cache, keys):
+		"""Remove nodes affected by given nodes from cache and from index. Returns removed keys.
+		Given nodes are removed from cache too."""
+		keys = set(hexkey(k) for k in keys)
+		stale = keys | self.affected(keys)
+
+		removed = []
+		for key in stale:
+			try:
+				del cache[key]
+				removed.append(key)
+			except KeyError:
+				pass
+
+		stale = list(stale)
+		with self.transaction() as connection:
+			for i in range(0, len(stale), self.chunk):
+				part = stale[i : i + self.chunk]
+				marks = ",".join("?" * len(part))
+				connection.execute("DELETE FROM edges WHERE parent IN ({})".format(marks), part)
+				connection.execute("DELETE FROM nodes WHERE key IN ({})".format(marks), part)
+		return removed
+
+	def close(self):
+		with self.mutex:
+			self.flush()
+			self.connection.close()
+
+def hexkey(key):
+	return key.__lazyhexhash__ if isinstance(key, LazyObject) else key
+
+def prefetch(roots):
+	"""Load cached nodes of lazy trees by batched reads (see SqliteCache.get_many).
+
+	Trees are walked from roots level by level with one get_many per cache per level,
+	so count of cache requests is proportional to trees' depth, not to nodes count.
+	Subtrees of cached nodes are not walked. Values of cached nodes are set to lazy objects,
+	so following unlazy doesn't search them in cache. Returns count of loaded nodes.
+	"""
+	count = 0
+	visited = set()
+	level = list(roots)
+	while level:
+		found = {}
+		missed = []
+		for obj in level:
+			key = obj.__lazyhexhash__
+			if key in visited or obj.__lazyvalue__ is not None:
+				continue
+			visited.add(key)
+			if obj.__decache__:
+				found.setdefault(id(obj.__lazybase__.cache), []).append(obj)
+			else:
+				missed.append(obj)
+
+		for objs in found.values():
+			values = get_many(objs[0].__lazybase__.cache, [ obj.__lazyhexhash__ for obj in objs ])
+			for obj in objs:
+				if obj.__lazyhexhash__ in values:
+					obj.__lazyvalue__ = values[obj.__lazyhexhash__]
+					count += 1
+				else:
+					missed.append(obj)
+
+		level = [ dep for obj in missed for dep in dependencies(obj) ]
+	return count
@@ -1,38 +1,257 @@
 #coding: utf-8
 
 import os
-import pickle
+import time
+import tempfile
+
+from evalcache.codec import dump_entry, load_entry
+from evalcache.filelock import FileLock
+from evalcache.lazy import reachable
 
 class DirCache:
 	"""Standart dict-like object that store pairs key-value as files in target directory.
 
+	Files are sharded by key prefix (f.e. ab/cd/abcdef... for levels = 2). Membership checks
+	are performed lazily on filesystem, so many processes can share one cache directory.
+	Values are written to temporary file and atomically replaced, so readers never see truncated files.
+	Files of early versions flat layout are readable too.
+
+	With singleflight enabled unlazy locks key's lock file during evaluation, so concurrent processes
+	don't compute the same node twice.
+
+	Cache size can be limited by bytes/entries budget. Entries are evicted by policy:
+	"lru" - least recently used first (by file's access time), "cost" - cheapest to recompute first
+	(evaluation times are recorded by unlazy in ".costs" log for this policy only, see setcost). 
+	Budget is checked after every 'slack' part of budget written. Eviction compacts costs log. gc method removes entries which are not reachable from given lazy trees.
+
+	Values are serialized by codec (see evalcache.codec). Format of entry is detected on load,
+	so entries written with different codecs can be mixed in one directory.
+
 	Arguments:
 	----------
-	dirpath - target directory path. If it isn't exists, we trying to create it. 
+	dirpath - target directory path. If it isn't exists, we trying to create it.
+	levels - count of two-symbols shard subdirectories (0 - flat layout).
+	codec - entries serializer (f.e. evalcache.BufferCodec() for numpy arrays, evalcache.ZlibCodec()). None - plain pickle.
+	singleflight - enable cross-process locking of evaluated keys.
+	maxsize - bytes budget (None - unlimited).
+	maxcount - entries budget (None - unlimited).
+	policy - eviction policy ("lru" or "cost").
+	slack - part of budget, after writing which budget is checked.
 
 	Exceptions:
 	-----------
 	IOException
 	"""
 
-	def __init__(self, dirpath):
+	def __init__(self, dirpath, levels = 2, codec = None, singleflight = True, 
+			maxsize = None, maxcount = None, policy = "lru", slack = 0.1):
 		self.dirpath = dirpath
+		self.levels = levels
+		self.codec = codec
+		self.singleflight = singleflight
+		self.maxsize = maxsize
+		self.maxcount = maxcount
+		self.policy = policy
+		self.slack = slack
+		self.costspath = os.path.join(dirpath, ".costs")
+
+		# Written since last budget check.
+		self.written = 0
+		self.writes = 0
 
 		if not os.path.exists(dirpath):
-			os.mkdir(dirpath)
-			self.files = set()
-		else:
-			lst = os.listdir(dirpath)
-			self.files = set(lst)
+			os.makedirs(dirpath, exist_ok = True)
+
+	def path(self, key):
+		"""Sharded path of key's file."""
+		if len(key) <= 2 * self.levels:
+			return os.path.join(self.dirpath, key)
+		shards = [ key[2*i : 2*i+2] for i in range(self.levels) ]
+		return os.path.join(self.dirpath, *shards, key)
+
+	def find(self, key):
+		"""Path of existing key's file or None."""
+		path = self.path(key)
+		if os.path.exists(path):
+			return path
+		flat = os.path.join(self.dirpath, key)
+		if flat != path and os.path.isfile(flat):
+			return flat
+		return None
+
+	def lock(self, key):
+		"""Cross-process lock of key. None if singleflight disabled."""
+		if not self.singleflight:
+			return None
+		path = self.path(key)
+		directory = os.path.dirname(path)
+		os.makedirs(directory, exist_ok = True)
+		return FileLock(os.path.join(directory, "." + key + ".lock"))
 
 	def __contains__(self, key):
-		return key in self.files
+		return self.find(key) is not None
 
 	def __setitem__(self, key, value):
-		with open(os.path.join(self.dirpath, key), "wb") as fl:
-			pickle.dump(value, fl)
-		self.files.add(key)
-	
+		self.store(key, lambda fl: dump_entry(value, fl, self.codec))
+
+	def putraw(self, key, data):
+		"""Store serialized entry (see evalcache.codec) as is."""
+		self.store(key, lambda fl: fl.write(data))
+
+	def store(self, key, dump):
+		"""Write key's file atomically by dump(fl) and check budget."""
+		path = self.path(key)
+		directory = os.path.dirname(path)
+		os.makedirs(directory, exist_ok = True)
+
+		fd, tmp = tempfile.mkstemp(dir = directory, prefix = ".", suffix = ".tmp")
+		try:
+			with os.fdopen(fd, "wb") as fl:
+				dump(fl)
+				size = fl.tell()
+			os.replace(tmp, path)
+		except BaseException:
+			os.unlink(tmp)
+			raise
+
+		self.written += size
+		self.writes += 1
+		if ((self.maxsize is not None and self.written > self.maxsize * self.slack)
+				or (self.maxcount is not None and self.writes > self.maxcount * self.slack)):
+			# Cost of just written entry isn't recorded yet (see setcost), so it is kept.
+			self.evict(keep = (key,))
+
+	def raw(self, key):
+		"""Serialized entry of key."""
+		path = self.find(key)
+		if path is None:
+			raise KeyError(key)
+		with open(path, "rb") as fl:
+			return fl.read()
+
 	def __getitem__(self, key):
-		with open(os.path.join(self.dirpath, key), "rb") as fl:
-			return pickle.load(fl)
\ No newline at end of file
+		path = self.find(key)
+		if path is None:
+			raise KeyError(key)
+		with open(path, "rb") as fl:
+			value = load_entry(fl)
+		if self.maxsize is not None or self.maxcount is not None:
+			# Access time is used by lru policy. Filesystem can be mounted with noatime/relatime.
+			os.utime(path, (time.time(), os.stat(path).st_mtime))
+		return value
+
+	def __delitem__(self, key):
+		path = self.find(key)
+		if path is None:
+			raise KeyError(key)
+		os.unlink(path)
+
+	def __iter__(self):
+		return iter(self.keys())
+
+	def keys(self):
+		return [ key for key, _, _ in self.entries() ]
+
+	def entries(self):
+		"""Iterate over stored entries as (key, path, stat) tuples. Service files are skipped."""
+		for root, dirs, files in os.walk(self.dirpath):
+			for name in files:
+				if name.startswith("."):
+					continue
+				path = os.path.join(root, name)
+				try:
+					yield name, path, os.stat(path)
+				except FileNotFoundError:
+					pass
+
+	def setcost(self, key, cost):
+		"""Record evaluation time of key's value in seconds. Used by "cost" eviction policy,
+		so with other policies costs aren't recorded."""
+		if self.policy != "cost":
+			return
+		with open(self.costspath, "a") as fl:
+			fl.write("{} {:.6f}\n".format(key, cost))
+
+	def costs(self):
+		"""Recorded evaluation times of entries."""
+		result = {}
+		try:
+			with open(self.costspath) as fl:
+				for line in fl:
+					parts = line.split()
+					if len(parts) == 2:
+						result[parts[0]] = float(parts[1])
+		except FileNotFoundError:
+			pass
+		return result
+
+	def evict(self, maxsize = None, maxcount = None, policy = None, keep = ()):
+		"""Remove entries while budget is exceeded. Returns removed keys.
+
+		Arguments are defaults from constructor if not specified. Keys from 'keep' aren't removed.
+		Entries without recorded cost are considered as free for recompute.
+		"""
+		maxsize = self.maxsize if maxsize is None else maxsize
+		maxcount = self.maxcount if maxcount is None else maxcount
+		policy = self.policy if policy is None else policy
+
+		entries = list(self.entries())
+		if policy == "lru":
+			entries.sort(key = lambda e: e[2].st_atime)
+		elif policy == "cost":
+			costs = self.costs()
+			entries.sort(key = lambda e: (costs.get(e[0], 0.0), e[2].st_atime))
+		else:
+			raise ValueError("Unknown eviction policy: {}".format(policy))
+
+		size = sum(st.st_size for _, _, st in entries)
+		count = len(entries)
+		removed = []
+		for key, path, st in entries:
+			if (maxsize is None or size <= maxsize) and (maxcount is None or count <= maxcount):
+				break
+			if key in keep:
+				continue
+			self.remove(path)
+			size -= st.st_size
+			count -= 1
+			removed.append(key)
+
+		self.written = 0
+		self.writes = 0
+		self.compact(removed)
+		return removed
+
+	def gc(self, roots):
+		"""Remove entries which are not reachable from lazy trees 'roots'. Returns removed keys.
+
+		Chunks of stream nodes ("<hash>.<index>") are kept with their node.
+		Disclamer: results of lazy trees, which are returned by lazy functions, are not reachable.
+		"""
+		keep = reachable(roots)
+		removed = []
+		for key, path, _ in list(self.entries()):
+			if key.split(".", 1)[0] not in keep:
+				self.remove(path)
+				removed.append(key)
+		self.compact(removed)
+		return removed
+
+	def remove(self, path):
+		try:
+			os.unlink(path)
+		except FileNotFoundError:
+			pass
+
+	def compact(self, keys = ()):
+		"""Rewrite costs log without repeated records and without costs of keys."""
+		if not os.path.exists(self.costspath):
+			return
+		keys = set(keys)
+		costs = self.costs()
+		fd, tmp = tempfile.mkstemp(dir = self.dirpath, prefix = ".", suffix = ".tmp")
+		with os.fdopen(fd, "w") as fl:
+			for key, cost in costs.items():
+				if key not in keys:
+					fl.write("{} {:.6f}\n".format(key, cost))
+		os.replace(tmp, self.costspath)
@@ -0,0 +1,507 @@
+#coding: utf-8
+
+"""Distributed evaluation of lazy trees.
+
+Cluster is a coordinator. It serves task queues by multiprocessing.managers, so workers
+can be started on other hosts. unlazy walks the tree like parallel scheduler (see evalcache.scheduler)
+and sends ready nodes to workers. Dependencies are sent as references by __lazyhexhash__:
+worker takes their values from its memory or from shared cache. Worker stores result in shared
+cache and replies with the key only, so values don't flow through coordinator.
+
+Scheduling is locality-aware: a ready node is sent to the worker, which holds the most of its inputs
+in memory (computed or loaded them early). Ties are broken by worker's load.
+
+Only nodes which are stored and loaded by cache (__encache__ and __decache__) are scheduled separately.
+Other nodes (f.e. attribute getting) are evaluated inside task of their user. Tasks which can't be
+pickled (lambdas, closures) are evaluated by coordinator.
+
+Workers send heartbeats. Worker which is silent longer than cluster's timeout is considered dead:
+it is unregistered and its running tasks are sent to other workers. Replies are tagged by
+unlazy's identifier, so late replies of failed or abandoned unlazy are dropped.
+
+cluster = evalcache.Cluster(("0.0.0.0", 5000), authkey = b"secret")
+cluster.start()
+# on every worker's host:
+#     evalcache worker HOST:5000 --dir /shared/evalcache --authkey secret
+result = cluster.unlazy(tree) # or evalcache.Lazy(cache, executor = cluster)
+"""
+
+import sys
+import uuid
+import time
+import queue
+import types
+import pickle
+import argparse
+import threading
+import traceback
+import collections
+import multiprocessing.managers
+
+from evalcache.lazy import LazyObject, lazyload, lazyrelease, dependencies, expand, emit, cachebatch
+from evalcache.scheduler import FunctionReference, picklable
+
+class Registry:
+	"""Coordinator's queues. Lives in coordinator process, workers use it by proxies."""
+
+	def __init__(self):
+		self.queues = collections.OrderedDict()
+		self.seen = {}  # worker -> time of last heartbeat
+		self.replies = queue.Queue()
+		self.mutex = threading.Lock()
+
+	def tasks(self, worker):
+		"""Task queue of worker. Worker is registered on the first call."""
+		with self.mutex:
+			if worker not in self.queues:
+				self.queues[worker] = queue.Queue()
+				self.seen[worker] = time.time()
+			return self.queues[worker]
+
+	def results(self):
+		return self.replies
+
+	def registry(self):
+		return self
+
+	def beat(self, worker):
+		"""Worker's heartbeat."""
+		with self.mutex:
+			if worker in self.queues:
+				self.seen[worker] = time.time()
+
+	def silent(self, timeout):
+		"""Workers without heartbeat for timeout seconds."""
+		now = time.time()
+		with self.mutex:
+			return [ worker for worker, seen in self.seen.items() if now - seen > timeout ]
+
+	def remove(self, worker):
+		"""Unregister worker. Its queued tasks are dropped."""
+		with self.mutex:
+			self.queues.pop(worker, None)
+			self.seen.pop(worker, None)
+
+	def workers(self):
+		with self.mutex:
+			return list(self.queues)
+
+class WorkerManager(multiprocessing.managers.BaseManager):
+	"""Worker's side of cluster connection."""
+
+WorkerManager.register("tasks")
+WorkerManager.register("results")
+WorkerManager.register("registry")
+
+class Cluster:
+	"""Coordinator of distributed evaluation. Can be used as lazifier's executor.
+
+	Arguments:
+	----------
+	address -- (host, port) of task queues server. Port 0 - any free port (see address after start).
+	authkey -- authentication key of connections
+	slots -- maximal count of tasks sent to one worker at once
+	timeout -- seconds without heartbeat after which worker is considered dead
+		(should be several times greater than workers' heartbeat interval)
+	"""
+
+	def __init__(self, address = ("localhost", 0), authkey = b"evalcache", slots = 2, timeout = 30):
+		self.authkey = authkey
+		self.slots = slots
+		self.timeout = timeout
+		self.registry = Registry()
+
+		class Manager(multiprocessing.managers.BaseManager):
+			pass
+		Manager.register("tasks", callable = self.registry.tasks)
+		Manager.register("results", callable = self.registry.results)
+		Manager.register("registry", callable = self.registry.registry, exposed = ("beat",))
+		self.manager = Manager(address, authkey)
+		self.server = None
+
+	@property
+	def address(self):
+		return self.server.address
+
+	def start(self):
+		"""Start serving of task queues in background thread."""
+		self.server = self.manager.get_server()
+		threading.Thread(target = self.server.serve_forever, daemon = True).start()
+		return self
+
+	def workers(self):
+		"""Identifiers of connected workers."""
+		return self.registry.workers()
+
+	def wait(self, count, timeout = None):
+		"""Wait for count of connected workers. Returns True on success."""
+		deadline = None if timeout is None else time.time() + timeout
+		while len(self.workers()) < count:
+			if deadline is not None and time.time() > deadline:
+				return False
+			time.sleep(0.05)
+		return True
+
+	def close(self, timeout = 5):
+		"""Stop workers and queues server.
+
+		Server is stopped after workers released their proxies (or after timeout, f.e. if
+		some worker is dead), else releasing would wait for stopped server."""
+		for worker in self.workers():
+			self.registry.tasks(worker).put(None)
+		deadline = time.time() + timeout
+		while (self.server is not None and self.server.id_to_refcount 
+				and time.time() < deadline):
+			time.sleep(0.05)
+
+		if self.server is not None:
+			self.server.stop_event.set()
+			self.server.listener.close()
+			self.server = None
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def unlazy(self, root):
+		"""Get a result of evaluation using cluster's workers.
+
+		Results are stored in root's lazifier cache, which should be shared with workers
+		(f.e. DirCache on shared filesystem or HttpCache).
+		"""
+		if lazyload(root):
+			return lazyrelease(root)
+		with cachebatch(root.__lazybase__.cache):
+			return Schedule(self, root).run()
+
+def scheduled(obj):
+	"""True if node is scheduled as separate task."""
+	return obj.generic is not None and obj.__encache__ and obj.__decache__
+
+def inputs(obj):
+	"""Scheduled nodes which are used by node's task. Not scheduled nodes are walked through."""
+	out = []
+	stack = list(reversed(dependencies(obj)))
+	while stack:
+		dep = stack.pop()
+		if dep.__lazyvalue__ is not None or scheduled(dep):
+			out.append(dep)
+		else:
+			stack.extend(reversed(dependencies(dep)))
+	return out
+
+def encode(arg):
+	"""Task's specification of argument. Scheduled nodes are references by key,
+	not scheduled are evaluated inside task."""
+	if isinstance(arg, LazyObject):
+		if arg.__lazyvalue__ is not None:
+			return ("value", reference(arg.__lazyvalue__))
+		if scheduled(arg):
+			return ("ref", arg.__lazyhexhash__)
+		return ("node", encode(arg.generic), encode(arg.args), encode(arg.kwargs))
+	if isinstance(arg, list) or isinstance(arg, tuple):
+		return ("list", [ encode(a) for a in arg ])
+	if isinstance(arg, dict) or isinstance(arg, types.MappingProxyType):
+		return ("dict", [ (encode(k), encode(v)) for k, v in arg.items() ])
+	return ("value", reference(arg))
+
+def reference(value):
+	"""Decorated functions are sent by reference (see scheduler.FunctionReference)."""
+	return picklable(value) if isinstance(value, types.FunctionType) else value
+
+def decode(spec, fetch):
+	"""Evaluate task's specification. fetch(key) returns value of referenced node."""
+	kind = spec[0]
+	if kind == "value":
+		value = spec[1]
+		return value.resolve() if isinstance(value, FunctionReference) else value
+	if kind == "ref":
+		return fetch(spec[1])
+	if kind == "list":
+		return [ decode(s, fetch) for s in spec[1] ]
+	if kind == "dict":
+		return { decode(k, fetch) : decode(v, fetch) for k, v in spec[1] }
+	func, args, kwargs = decode(spec[1], fetch), decode(spec[2], fetch), decode(spec[3], fetch)
+	return expand(func(*args, **kwargs))
+
+def execute(cache, key, spec, store, fetch):
+	"""Evaluate task and store result in cache. Returns result and evaluation time.
+	Key is locked if cache supports it (see DirCache.lock)."""
+	lock = getattr(cache, "lock", None) if store else None
+	lock = lock(key) if lock is not None else None
+	if lock is not None:
+		lock.acquire()
+	try:
+		if lock is not None and key in cache:
+			return cache[key], 0.0
+		start = time.perf_counter()
+		value = decode(spec, fetch)
+		cost = time.perf_counter() - start
+		if store:
+			cache[key] = value
+		return value, cost
+	finally:
+		if lock is not None:
+			lock.release()
+
+class Schedule:
+	"""State of one distributed unlazy."""
+
+	def __init__(self, cluster, root):
+		self.cluster = cluster
+		self.root = root
+		self.cache = root.__lazybase__.cache
+		self.registry = cluster.registry
+
+		self.nodes = {}     # key -> LazyObject
+		self.waits = {}     # key -> count of not evaluated inputs
+		self.users = {}     # key -> list of dependent keys
+		self.ready = []
+		self.holders = {}   # key -> set of workers, which hold value in memory
+		self.load = collections.Counter()  # worker -> count of running tasks
+		self.running = {}   # key -> worker
+		self.values = {}    # values of tasks evaluated by coordinator and not stored
+		self.ident = uuid.uuid4().hex
+
+	def walk(self):
+		stack = [self.root]
+		while stack:
+			obj = stack.pop()
+			key = obj.__lazyhexhash__
+			if key in self.nodes:
+				continue
+			self.nodes[key] = obj
+			if obj.__lazyvalue__ is not None or (obj.__decache__ and key in self.cache):
+				continue
+
+			deps = [ dep for dep in inputs(obj) if dep.__lazyvalue__ is None ]
+			keys = set(dep.__lazyhexhash__ for dep in deps)
+			self.waits[key] = len(keys)
+			for dep in keys:
+				self.users.setdefault(dep, []).append(key)
+			if not keys:
+				self.ready.append(key)
+			stack.extend(deps)
+
+		for key in list(self.nodes):
+			if key not in self.waits:
+				self.done(key)
+
+	def done(self, key):
+		for user in self.users.pop(key, ()):
+			if user in self.waits:
+				self.waits[user] -= 1
+				if self.waits[user] == 0:
+					self.ready.append(user)
+
+	def choose(self, refs):
+		"""Worker with the most of inputs in memory and with free slot, or None."""
+		best = None
+		for worker in self.registry.workers():
+			if self.load[worker] >= self.cluster.slots:
+				continue
+			score = (sum(1 for r in refs if worker in self.holders.get(r, ())), -self.load[worker])
+			if best is None or score > best[0]:
+				best = (score, worker)
+		return None if best is None else best[1]
+
+	def fetch(self, key):
+		if key in self.values:
+			return self.values[key]
+		return self.cache[key]
+
+	def dispatch(self, key):
+		"""Send ready node to worker or evaluate it locally. Returns False if all workers are busy."""
+		obj = self.nodes[key]
+		spec = ("node", encode(obj.generic), encode(obj.args), encode(obj.kwargs))
+		refs = [ dep.__lazyhexhash__ for dep in inputs(obj) if dep.__lazyvalue__ is None ]
+		reply = not scheduled(obj)
+
+		try:
+			task = pickle.dumps((self.ident, key, spec, obj.__encache__, reply))
+		except (pickle.PicklingError, AttributeError, TypeError):
+			task = None
+
+		if task is None or not self.registry.workers():
+			value, cost = execute(self.cache, key, spec, obj.__encache__, self.fetch)
+			self.finish(key, None, value, cost)
+			return True
+
+		worker = self.choose(refs)
+		if worker is None:
+			return False
+		self.load[worker] += 1
+		self.running[key] = worker
+		for ref in refs:
+			self.holders.setdefault(ref, set()).add(worker)
+		self.registry.tasks(worker).put(task)
+		return True
+
+	def finish(self, key, worker, value, cost):
+		obj = self.nodes[key]
+		if worker is not None:
+			self.holders.setdefault(key, set()).add(worker)
+		if value is not None:
+			if obj is self.root:
+				obj.__lazyvalue__ = value
+			else:
+				self.values[key] = value
+		emit(obj, "eval", time.perf_counter() - cost, cost)
+		if obj.__lazybase__.index is not None:
+			obj.__lazybase__.index.record(obj)
+		setcost = getattr(self.cache, "setcost", None)
+		if setcost is not None and obj.__encache__:
+			setcost(key, cost)
+		self.done(key)
+
+	def reap(self):
+		"""Unregister silent workers and return their running tasks to ready list."""
+		for worker in self.registry.silent(self.cluster.timeout):
+			self.registry.remove(worker)
+			for key, owner in list(self.running.items()):
+				if owner == worker:
+					del self.running[key]
+					self.ready.append(key)
+			self.load.pop(worker, None)
+			for holders in self.holders.values():
+				holders.discard(worker)
+
+	def run(self):
+		self.walk()
+		results = self.registry.results()
+		poll = min(1.0, self.cluster.timeout / 4)
+		while self.ready or self.running:
+			while self.ready:
+				key = self.ready.pop()
+				if not self.dispatch(key):
+					self.ready.append(key)
+					break
+
+			if not self.running:
+				continue
+			try:
+				message = results.get(timeout = poll)
+			except queue.Empty:
+				self.reap()
+				continue
+			ident, worker, key, cost, error, value = message
+			if ident != self.ident or self.running.get(key) != worker:
+				# Reply of other unlazy or of task re-dispatched from silent worker.
+				continue
+			del self.running[key]
+			self.load[worker] -= 1
+			if error is not None:
+				raise RuntimeError("evalcache worker {} failed on {}:\n{}".format(worker, key, error))
+			self.finish(key, worker, value, cost)
+
+		root = self.root
+		if root.__lazyvalue__ is None:
+			root.__lazyvalue__ = self.cache[root.__lazyhexhash__]
+		return lazyrelease(root)
+
+class Worker:
+	"""Worker of cluster. Evaluates tasks and stores results in shared cache.
+
+	Arguments:
+	----------
+	address -- cluster's (host, port)
+	cache -- shared dict-like cache (f.e. DirCache on shared filesystem or HttpCache)
+	authkey -- authentication key
+	memory -- count of values kept in memory for tasks of following nodes
+	heartbeat -- heartbeat interval in seconds (see Cluster's timeout)
+	"""
+
+	def __init__(self, address, cache, authkey = b"evalcache", memory = 1024, heartbeat = 2.0):
+		self.address = tuple(address)
+		self.cache = cache
+		self.authkey = authkey
+		self.memory = memory
+		self.heartbeat = heartbeat
+		self.values = collections.OrderedDict()
+		self.ident = uuid.uuid4().hex
+
+	def remember(self, key, value):
+		self.values[key] = value
+		self.values.move_to_end(key)
+		while len(self.values) > self.memory:
+			self.values.popitem(last = False)
+
+	def fetch(self, key):
+		if key in self.values:
+			self.values.move_to_end(key)
+			return self.values[key]
+		value = self.cache[key]
+		self.remember(key, value)
+		return value
+
+	def run(self):
+		"""Process tasks until cluster is closed."""
+		manager = WorkerManager(self.address, self.authkey)
+		manager.connect()
+		tasks = manager.tasks(self.ident)
+		results = manager.results()
+		stop = threading.Event()
+		beating = threading.Thread(target = self.beat, args = (manager, stop), daemon = True)
+		beating.start()
+
+		try:
+			while True:
+				try:
+					task = tasks.get()
+				except (EOFError, ConnectionError):
+					return
+				if task is None:
+					# Release proxies while server is alive.
+					stop.set()
+					beating.join()
+					del tasks, results
+					return
+
+				schedule, key, spec, store, reply = pickle.loads(task)
+				try:
+					value, cost = execute(self.cache, key, spec, store, self.fetch)
+					self.remember(key, value)
+					results.put((schedule, self.ident, key, cost, None, value if reply else None))
+				except Exception:
+					results.put((schedule, self.ident, key, 0.0, traceback.format_exc(), None))
+		finally:
+			stop.set()
+
+	def beat(self, manager, stop):
+		"""Send heartbeats until stop is set (proxies are thread-local, so evaluation doesn't block it)."""
+		registry = manager.registry()
+		try:
+			while True:
+				registry.beat(self.ident)
+				if stop.wait(self.heartbeat):
+					break
+		except (EOFError, ConnectionError):
+			pass
+		del registry
+
+def run_worker(address, cache, authkey = b"evalcache", memory = 1024, heartbeat = 2.0):
+	"""Run worker (f.e. multiprocessing.Process target)."""
+	Worker(address, cache, authkey, memory, heartbeat).run()
+
+def main(argv = None):
+	from evalcache.dircache import DirCache
+	from evalcache.httpcache import HttpCache
+
+	parser = argparse.ArgumentParser(prog = "evalcache worker", description = "evalcache cluster worker")
+	parser.add_argument("address", help = "cluster's HOST:PORT")
+	parser.add_argument("--dir", help = "shared DirCache directory")
+	parser.add_argument("--url", help = "shared HttpCache server's url")
+	parser.add_argument("--authkey", default = "evalcache")
+	parser.add_argument("--memory", type = int, default = 1024)
+	parser.add_argument("--heartbeat", type = float, default = 2.0, help = "heartbeat interval in seconds")
+	parser.add_argument("--path", action = "append", default = [], help = "directory of user's modules (sys.path)")
+	args = parser.parse_args(argv)
+
+	if not args.dir and not args.url:
+		parser.error("--dir or --url is required")
+	sys.path[:0] = args.path
+	host, port = args.address.rsplit(":", 1)
+	cache = HttpCache(args.url, local = DirCache(args.dir) if args.dir else None) if args.url else DirCache(args.dir)
+	run_worker((host, int(port)), cache, args.authkey.encode("utf-8"), args.memory, args.heartbeat)
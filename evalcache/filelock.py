@@ -0,0 +1,112 @@
+#coding: utf-8
+
+import os
+import time
+import threading
+
+try:
+	import fcntl
+except ImportError:
+	fcntl = None
+
+## Locks held by this process: path -> [fd, count].
+held = {}
+mutex = threading.Lock()
+
+class FileLock:
+	"""Cross-process exclusive lock on lock file.
+
+	On POSIX systems flock is used. Lock is released by kernel if owner process dies.
+	Lock file is removed by owner on release.
+
+	On other systems lock file is created with O_EXCL. Lock file older than 'lease' seconds
+	is considered stale (owner died) and is removed.
+
+	Lock is reentrant inside process: path, which is held by this process, is acquired without waiting
+	(f.e. nested unlazy of the node, which is evaluated by outer unlazy).
+
+	Arguments:
+	----------
+	path -- lock file path
+	lease -- stale lease timeout in seconds (O_EXCL mode only)
+	poll -- polling interval in seconds (O_EXCL mode only)
+	"""
+
+	def __init__(self, path, lease = 3600, poll = 0.1):
+		self.path = path
+		self.lease = lease
+		self.poll = poll
+		self.fd = None
+
+	def acquire(self, blocking = True):
+		"""Acquire lock. If blocking is False, returns False instead of waiting for other owner."""
+		with mutex:
+			if self.path in held:
+				held[self.path][1] += 1
+				self.fd = held[self.path][0]
+				return True
+
+		if fcntl is not None:
+			acquired = self.acquire_flock(blocking)
+		else:
+			acquired = self.acquire_excl(blocking)
+		if acquired:
+			with mutex:
+				held[self.path] = [self.fd, 1]
+		return acquired
+
+	def acquire_flock(self, blocking):
+		while True:
+			fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+			try:
+				fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+			except BlockingIOError:
+				os.close(fd)
+				return False
+			# Previous owner could remove lock file while we were waiting. Then we own a dead inode.
+			try:
+				if os.fstat(fd).st_ino == os.stat(self.path).st_ino:
+					self.fd = fd
+					return True
+			except FileNotFoundError:
+				pass
+			os.close(fd)
+
+	def acquire_excl(self, blocking):
+		while True:
+			try:
+				self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+				os.write(self.fd, str(os.getpid()).encode("ascii"))
+				return True
+			except FileExistsError:
+				pass
+			try:
+				if time.time() - os.path.getmtime(self.path) > self.lease:
+					os.unlink(self.path)
+					continue
+			except FileNotFoundError:
+				continue
+			if not blocking:
+				return False
+			time.sleep(self.poll)
+
+	def release(self):
+		with mutex:
+			held[self.path][1] -= 1
+			if held[self.path][1] > 0:
+				self.fd = None
+				return
+			del held[self.path]
+		try:
+			os.unlink(self.path)
+		except FileNotFoundError:
+			pass
+		os.close(self.fd)
+		self.fd = None
+
+	def __enter__(self):
+		self.acquire()
+		return self
+
+	def __exit__(self, *exc):
+		self.release()
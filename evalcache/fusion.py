@@ -0,0 +1,98 @@
+#coding: utf-8
+
+"""Fusion of operator nodes.
+
+If lazifier is constructed with fuse = True, operators of lazy objects construct expression nodes.
+Operand, which is an expression node too, is inlined, so formula (a * b + c) / d becomes one node
+with single hash, single evaluation and single cache entry. Its arguments are leaves of formula
+(not operator lazy objects and constants).
+
+Expression is evaluated by function compiled from formula's source, so it works elementwise
+for numpy arrays without intermediate nodes.
+
+Inlining depth is limited by MAXDEPTH operators: expression node of long chain (f.e. x = x + 1 in loop)
+becomes a leaf of the next one. So formula's source (and its compilation time) is bounded 
+and parser's nesting limit isn't exceeded.
+"""
+
+import re
+import collections
+
+from evalcache.lazy import LazyObject
+
+## Maximal count of nested operators in one expression node.
+MAXDEPTH = 32
+
+## Compiled functions by (source, arity). Least recently used are dropped.
+compiled = collections.OrderedDict()
+compiled_size = 1024
+
+placeholder = re.compile(r"_(\d+)")
+
+class Expression:
+	"""Generic of fused node. Formula's source uses placeholders _0, _1, ... for arguments.
+	depth is count of nested operators (it isn't hashed, source determines it)."""
+
+	__slots__ = ("source", "arity", "depth", "function")
+
+	def __init__(self, source, arity, depth = 1):
+		self.source = source
+		self.arity = arity
+		self.depth = depth
+		self.function = compile_expression(source, arity)
+
+	def __evalcache_hash__(self, m):
+		m.update(b"evalcache.expression")
+		m.update(self.source.encode("utf-8"))
+
+	def __call__(self, *args):
+		return self.function(*args)
+
+	def __reduce__(self):
+		return (Expression, (self.source, self.arity, self.depth))
+
+	def __repr__(self):
+		return "Expression({})".format(self.source)
+
+def compile_expression(source, arity):
+	key = (source, arity)
+	function = compiled.get(key)
+	if function is not None:
+		compiled.move_to_end(key)
+		return function
+
+	names = ", ".join("_{}".format(i) for i in range(arity))
+	function = compiled[key] = eval("lambda {}: {}".format(names, source), { "__builtins__": __builtins__ })
+	if len(compiled) > compiled_size:
+		compiled.popitem(last = False)
+	return function
+
+def fuse(lazifier, template, operands):
+	"""Construct expression node. template is str.format pattern of operands (f.e. "{0} + {1}")."""
+	leaves = []
+	ids = {}
+
+	def leaf(arg):
+		if isinstance(arg, LazyObject):
+			index = ids.get(id(arg))
+			if index is None:
+				index = ids[id(arg)] = len(leaves)
+				leaves.append(arg)
+		else:
+			index = len(leaves)
+			leaves.append(arg)
+		return "_{}".format(index)
+
+	parts = []
+	depth = 1
+	for operand in operands:
+		if (isinstance(operand, LazyObject) and isinstance(operand.generic, Expression) 
+				and operand.generic.depth < MAXDEPTH):
+			args = operand.args
+			parts.append(placeholder.sub(lambda match: leaf(args[int(match.group(1))]), operand.generic.source))
+			depth = max(depth, operand.generic.depth + 1)
+		else:
+			parts.append(leaf(operand))
+
+	source = "(" + template.format(*parts) + ")"
+	return LazyObject(lazifier, Expression(source, len(leaves), depth), tuple(leaves))
@@ -0,0 +1,229 @@
+#coding: utf-8
+
+"""Hashing engine for lazy objects' keys.
+
+Hash function for a type is resolved once per class:
+1. Registered function from 'hashfuncs' table (see register_hash).
+2. Protocol method obj.__evalcache_hash__(m).
+3. Raw data for buffer-protocol objects (bytes, bytearray, array.array, numpy arrays...).
+4. Object's representation.
+
+Hash function can update hash itself and/or return sequence of subobjects
+which will be hashed next. So containers are hashed iteratively without recursion.
+
+Possible problems of hashing are reported by EvalcacheWarning once per class or lambda's
+definition site (see warnings and logging.captureWarnings).
+"""
+
+import sys
+import types
+import hashlib
+import warnings
+import collections
+
+def updatehash_list(m, obj):
+	return obj
+
+def updatehash_dict(m, obj):
+	items = []
+	for k, v in sorted(obj.items()):
+		items.append(k)
+		items.append(v)
+	return items
+
+## Memo of functions' hash data by (id, code). Functions are holded, so id can't be reused.
+functions_memo = collections.OrderedDict()
+functions_memo_size = 4096
+
+class EvalcacheWarning(UserWarning):
+	"""Warning about possibly incorrect caching."""
+
+## Keys of emitted warnings.
+warned = set()
+
+def warn_once(key, message, filename = None, lineno = None):
+	"""Emit EvalcacheWarning once per key (f.e. per class or per definition site).
+	Warning is attributed to filename:lineno if specified."""
+	if key in warned:
+		return
+	warned.add(key)
+	if filename is not None:
+		warnings.warn_explicit(message, EvalcacheWarning, filename, lineno)
+	else:
+		warnings.warn(message, EvalcacheWarning, stacklevel = 3)
+
+def code_identity(code):
+	"""Bytecode, names and constants of code object (nested code objects too)."""
+	data = [ code.co_code, repr(code.co_names).encode("utf-8") ]
+	for const in code.co_consts:
+		if isinstance(const, types.CodeType):
+			data.append(code_identity(const))
+		elif isinstance(const, frozenset):
+			# Order of set's representation depends on PYTHONHASHSEED.
+			data.append(repr(sorted(repr(item) for item in const)).encode("utf-8"))
+		else:
+			data.append(repr(const).encode("utf-8"))
+	return b"".join(data)
+
+def function_identity(obj, code = False):
+	"""Hash data of function: qualname, module and module's file. If code is True, 
+	function's bytecode and default arguments are added, so function's editing changes its hash. 
+	Result is memoized."""
+	key = (id(obj), code)
+	try:
+		return functions_memo[key][1]
+	except KeyError:
+		pass
+
+	data = []
+	if hasattr(obj, "__qualname__"):
+		if obj.__qualname__ == "<lambda>" and hasattr(obj, "__code__"):
+			site = (obj.__code__.co_filename, obj.__code__.co_firstlineno)
+			warn_once(("lambda",) + site, "evalcache can't work with global lambdas correctly", *site)
+		data.append(obj.__qualname__.encode("utf-8"))
+	elif hasattr(obj, "__name__"):
+		data.append(obj.__name__.encode("utf-8"))
+	if hasattr(obj, "__module__") and obj.__module__:
+		data.append(obj.__module__.encode("utf-8"))
+		data.append(getattr(sys.modules.get(obj.__module__), "__file__", "").encode("utf-8"))
+	if code and hasattr(obj, "__code__"):
+		data.append(code_identity(obj.__code__))
+		m = hashlib.sha256()
+		updatehash(m, (getattr(obj, "__defaults__", None), getattr(obj, "__kwdefaults__", None)))
+		data.append(m.digest())
+	data = b"".join(data)
+
+	functions_memo[key] = (obj, data)
+	if len(functions_memo) > functions_memo_size:
+		functions_memo.popitem(last = False)
+	return data
+
+def functionhash(algo, obj, code = False):
+	"""Digest of function's identity (see function_identity)."""
+	m = algo()
+	m.update(function_identity(obj, code))
+	return m.digest()
+
+def updatehash_function(m, obj):
+	m.update(function_identity(obj))
+
+def updatehash_buffer(m, obj):
+	"""Hash raw data of buffer-protocol object. Object's type, format and shape are hashed too.
+	Buffers of objects (f.e. numpy array with object dtype) contain pointers, so their elements are hashed."""
+	try:
+		view = memoryview(obj)
+	except (TypeError, ValueError):
+		# Class supports buffer protocol, but not this instance.
+		return updatehash_repr(m, obj)
+
+	m.update(repr((obj.__class__.__qualname__, view.format, view.shape)).encode("utf-8"))
+	if "O" in view.format:
+		tolist = getattr(obj, "tolist", None)
+		try:
+			return [ tolist() if tolist is not None else list(obj) ]
+		except TypeError:
+			return updatehash_repr(m, obj)
+	m.update(view if view.c_contiguous else view.tobytes())
+
+def updatehash_protocol(m, obj):
+	return obj.__evalcache_hash__(m)
+
+def updatehash_repr(m, obj):
+	if obj.__class__.__repr__ is object.__repr__:
+		warn_once(("repr", obj.__class__), "object of class {} uses common __repr__ method. "
+			"Cache may not work correctly".format(obj.__class__))
+	m.update(repr(obj).encode("utf-8"))
+
+## Table of hash functions for special types.
+hashfuncs = {
+	tuple: updatehash_list,
+	list: updatehash_list,
+	dict: updatehash_dict,
+	types.FunctionType: updatehash_function,
+	bytes: updatehash_buffer,
+	bytearray: updatehash_buffer,
+	memoryview: updatehash_buffer,
+}
+
+## Resolved hash functions by class.
+resolved = {}
+
+def register_hash(cls, func):
+	"""Set hash function for class.
+
+	func(m, obj) should update hashlib-like algo 'm' and can return sequence of subobjects for hashing.
+	"""
+	hashfuncs[cls] = func
+	resolved.clear()
+
+def resolve(obj):
+	cls = obj.__class__
+	if cls in hashfuncs:
+		func = hashfuncs[cls]
+	elif hasattr(cls, "__evalcache_hash__"):
+		func = updatehash_protocol
+	else:
+		try:
+			memoryview(obj)
+			func = updatehash_buffer
+		except TypeError:
+			func = updatehash_repr
+		except ValueError:
+			# Class supports buffer protocol, but not this instance.
+			func = updatehash_buffer
+	resolved[cls] = func
+	return func
+
+def updatehash(m, obj):
+	"""Update hash in hashlib-like algo with hashable object
+
+	As usual we use hash of object representation, but for special types we can set
+	special updatehash functions (see 'hashfuncs' table and register_hash).
+
+	Warn: If you use changing between program starts object representation (f.e. object.__repr__)
+	for hashing, this library will not be work corectly.
+
+	Arguments
+	---------
+	m -- hashlib-like algorithm instance.
+	obj -- hashable object
+	"""
+	stack = [obj]
+	while stack:
+		obj = stack.pop()
+		func = resolved.get(obj.__class__) or resolve(obj)
+		subobjects = func(m, obj)
+		if subobjects:
+			if not isinstance(subobjects, (list, tuple)):
+				subobjects = list(subobjects)
+			stack.extend(reversed(subobjects))
+
+## Memo of endpoint's hashes by id for immutable values. Memo keeps values alive (so ids are valid),
+## so large strings and bytes aren't memoized.
+immutable = (str, bytes, int, float, complex, types.FunctionType, types.BuiltinFunctionType)
+endpoints_memo = collections.OrderedDict()
+endpoints_memo_size = 1024
+endpoints_memo_maxlen = 4096
+
+def endpointhash(algo, value):
+	"""Get digest of endpoint value. Immutable values' hashes are memoized."""
+	if value.__class__ not in immutable or (
+			isinstance(value, (str, bytes)) and len(value) > endpoints_memo_maxlen):
+		m = algo()
+		updatehash(m, value)
+		return m.digest()
+
+	key = (algo, id(value))
+	try:
+		return endpoints_memo[key][1]
+	except KeyError:
+		pass
+
+	m = algo()
+	updatehash(m, value)
+	result = m.digest()
+
+	endpoints_memo[key] = (value, result)
+	if len(endpoints_memo) > endpoints_memo_size:
+		endpoints_memo.popitem(last = False)
+	return result
@@ -0,0 +1,269 @@
+#coding: utf-8
+
+"""Shared network cache over HTTP.
+
+Protocol is content-addressed: entry of key is a resource "/<key>".
+GET returns serialized entry (see evalcache.codec), PUT stores it, HEAD checks existence,
+DELETE removes it. POST "/get_many" with newline separated keys in body returns found entries
+as sequence of frames: key, newline, 8 bytes big-endian length, entry.
+
+Reference server stores entries in directory with DirCache layout, so the directory
+can be used as DirCache too:
+
+evalcache serve DIRPATH [--host HOST] [--port PORT]
+"""
+
+import os
+import sys
+import queue
+import struct
+import argparse
+import http.client
+import http.server
+import urllib.parse
+
+from evalcache.codec import dumps_entry, loads_entry
+from evalcache.dircache import DirCache
+
+frame = struct.Struct(">Q")
+
+class HttpCache:
+	"""Dict-like client of shared cache server.
+
+	Connections are kept alive in pool, so concurrent threads don't wait for each other.
+	If local cache (f.e. DirCache) is specified, it is read-through tier: values are searched
+	in local cache first, values loaded from server and stored values are put to local cache.
+
+	Arguments:
+	----------
+	url -- server's url (f.e. "http://localhost:8000")
+	local -- local dict-like cache (None - without local tier)
+	pool -- count of kept alive connections
+	timeout -- connection timeout in seconds
+	codec -- entries serializer (see evalcache.codec, BufferCodec isn't supported). None - plain pickle.
+	"""
+
+	chunk = 500
+
+	def __init__(self, url, local = None, pool = 4, timeout = 60, codec = None):
+		parsed = urllib.parse.urlsplit(url)
+		self.host = parsed.hostname
+		self.port = parsed.port
+		self.prefix = parsed.path.rstrip("/")
+		self.local = local
+		self.timeout = timeout
+		self.codec = codec
+		self.pool = queue.LifoQueue(maxsize = pool)
+
+	def connection(self):
+		try:
+			return self.pool.get_nowait()
+		except queue.Empty:
+			return http.client.HTTPConnection(self.host, self.port, timeout = self.timeout)
+
+	def request(self, method, path, body = None):
+		"""Perform request on pooled connection. Returns status and body.
+		Connection closed by server is reopened once."""
+		url = self.prefix + "/" + urllib.parse.quote(path)
+		for attempt in (0, 1):
+			conn = self.connection()
+			try:
+				conn.request(method, url, body = body)
+				response = conn.getresponse()
+				data = response.read()
+			except (http.client.HTTPException, ConnectionError):
+				conn.close()
+				if attempt:
+					raise
+				continue
+
+			if response.will_close:
+				conn.close()
+			else:
+				try:
+					self.pool.put_nowait(conn)
+				except queue.Full:
+					conn.close()
+
+			if response.status >= 400 and response.status != 404:
+				raise IOError("cache server: {} {} {}".format(method, path, response.status))
+			return response.status, data
+
+	def __contains__(self, key):
+		if self.local is not None and key in self.local:
+			return True
+		status, _ = self.request("HEAD", key)
+		return status == 200
+
+	def __getitem__(self, key):
+		if self.local is not None and key in self.local:
+			return self.local[key]
+		status, data = self.request("GET", key)
+		if status == 404:
+			raise KeyError(key)
+		value = loads_entry(data)
+		if self.local is not None:
+			self.local[key] = value
+		return value
+
+	def __setitem__(self, key, value):
+		self.request("PUT", key, dumps_entry(value, self.codec))
+		if self.local is not None:
+			self.local[key] = value
+
+	def __delitem__(self, key):
+		if self.local is not None and key in self.local:
+			del self.local[key]
+		status, _ = self.request("DELETE", key)
+		if status == 404:
+			raise KeyError(key)
+
+	def get_many(self, keys):
+		"""Load values for many keys by batched requests. Returns dict with found pairs only."""
+		keys = list(keys)
+		result = {}
+		if self.local is not None:
+			for key in keys:
+				if key in self.local:
+					result[key] = self.local[key]
+			keys = [ key for key in keys if key not in result ]
+
+		for i in range(0, len(keys), self.chunk):
+			part = keys[i : i + self.chunk]
+			_, data = self.request("POST", "get_many", "\n".join(part).encode("utf-8"))
+			for key, entry in unframe(data):
+				value = loads_entry(entry)
+				result[key] = value
+				if self.local is not None:
+					self.local[key] = value
+		return result
+
+	def close(self):
+		while True:
+			try:
+				self.pool.get_nowait().close()
+			except queue.Empty:
+				return
+
+def unframe(data):
+	"""Iterate over (key, entry) frames of get_many response."""
+	offset = 0
+	while offset < len(data):
+		newline = data.index(b"\n", offset)
+		key = data[offset : newline].decode("utf-8")
+		size, = frame.unpack_from(data, newline + 1)
+		offset = newline + 1 + frame.size
+		yield key, data[offset : offset + size]
+		offset += size
+
+class CacheRequestHandler(http.server.BaseHTTPRequestHandler):
+	"""Reference server's handler. Connections are kept alive (HTTP/1.1)."""
+
+	protocol_version = "HTTP/1.1"
+
+	def key(self):
+		key = urllib.parse.unquote(self.path.lstrip("/"))
+		if not key or "/" in key or key.startswith("."):
+			return None
+		return key
+
+	def reply(self, status, data = b""):
+		self.send_response(status)
+		self.send_header("Content-Length", str(len(data)))
+		self.end_headers()
+		if self.command != "HEAD":
+			self.wfile.write(data)
+
+	def read(self, key):
+		try:
+			return self.server.store.raw(key)
+		except (KeyError, FileNotFoundError):
+			return None
+
+	def do_HEAD(self):
+		key = self.key()
+		self.reply(200 if key is not None and key in self.server.store else 404)
+
+	def do_GET(self):
+		key = self.key()
+		data = self.read(key) if key is not None else None
+		if data is None:
+			self.reply(404)
+		else:
+			self.reply(200, data)
+
+	def do_PUT(self):
+		key = self.key()
+		data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+		if key is None:
+			self.reply(400)
+			return
+
+		self.server.store.putraw(key, data)
+		self.reply(201)
+
+	def do_DELETE(self):
+		key = self.key()
+		path = self.server.store.find(key) if key is not None else None
+		if path is None:
+			self.reply(404)
+			return
+		os.unlink(path)
+		self.reply(204)
+
+	def do_POST(self):
+		data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+		if self.key() != "get_many":
+			self.reply(400)
+			return
+
+		frames = []
+		for key in data.decode("utf-8").split("\n"):
+			entry = self.read(key) if key and "/" not in key else None
+			if entry is not None:
+				frames.append(key.encode("utf-8") + b"\n" + frame.pack(len(entry)) + entry)
+		self.reply(200, b"".join(frames))
+
+	def log_message(self, format, *args):
+		if self.server.verbose:
+			http.server.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+class CacheServer(http.server.ThreadingHTTPServer):
+	"""Reference shared cache server. Entries are stored in directory with DirCache layout.
+
+	server = CacheServer(".evalcache-server", ("localhost", 8000))
+	server.serve_forever()
+
+	Arguments:
+	----------
+	dirpath -- storage directory
+	address -- (host, port) pair. Port 0 - any free port (see server_address).
+	verbose -- log requests to stderr
+	"""
+
+	daemon_threads = True
+
+	def __init__(self, dirpath, address = ("localhost", 8000), verbose = False):
+		self.store = DirCache(dirpath, singleflight = False)
+		self.verbose = verbose
+		http.server.ThreadingHTTPServer.__init__(self, address, CacheRequestHandler)
+
+	@property
+	def url(self):
+		host, port = self.server_address[:2]
+		return "http://{}:{}".format(host, port)
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(prog = "evalcache serve", description = "evalcache shared cache server")
+	parser.add_argument("dirpath")
+	parser.add_argument("--host", default = "localhost")
+	parser.add_argument("--port", type = int, default = 8000)
+	parser.add_argument("--verbose", action = "store_true")
+	args = parser.parse_args(argv)
+
+	server = CacheServer(args.dirpath, (args.host, args.port), args.verbose)
+	print("serving", args.dirpath, "on", server.url, file = sys.stderr)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
@@ -0,0 +1,96 @@
+#coding: utf-8
+
+"""Instrumentation of lazy trees evaluation.
+
+Lazifier sends events to its hooks (see evalcache.lazy.emit). Profiler is a hook,
+which collects events, aggregates costs by generic function's qualname and exports
+them as JSON or Chrome trace format (chrome://tracing, Perfetto).
+"""
+
+from __future__ import print_function
+
+import sys
+import json
+import threading
+
+## Counter's field of event kind in report.
+counters = { "hash": "hashes", "load": "loads", "eval": "evals", "store": "stores" }
+
+class Profiler:
+	"""Collecting instrumentation hook.
+
+	lazy = evalcache.Lazy(cache, hooks = [profiler])
+	or
+	lazy.hooks.append(profiler)
+	"""
+
+	def __init__(self):
+		self.events = []
+		self.mutex = threading.Lock()
+
+	def __call__(self, event):
+		with self.mutex:
+			self.events.append(event)
+
+	def clear(self):
+		with self.mutex:
+			self.events = []
+
+	def report(self):
+		"""Aggregate events by generic's qualname.
+
+		Returns dict: name -> statistics. Times are totals in seconds.
+		'recommend' is "cache" if mean evaluation is slower than mean load, "recompute" otherwise.
+		"""
+		result = {}
+		for e in self.events:
+			stats = result.get(e["name"])
+			if stats is None:
+				stats = result[e["name"]] = {
+					"evals": 0, "eval": 0.0, "hashes": 0, "hash": 0.0, "hits": 0, "misses": 0, "lookup": 0.0,
+					"loads": 0, "load": 0.0, "stores": 0, "store": 0.0, "size": 0
+				}
+
+			kind = e["event"]
+			if kind == "lookup":
+				stats["hits" if e["hit"] else "misses"] += 1
+			else:
+				stats[counters[kind]] += 1
+			stats[kind] += e["duration"]
+			if kind == "store" and e["size"] is not None:
+				stats["size"] += e["size"]
+
+		for stats in result.values():
+			stats["recommend"] = None
+			if stats["evals"] and stats["loads"]:
+				cheaper = stats["eval"] / stats["evals"] < stats["load"] / stats["loads"]
+				stats["recommend"] = "recompute" if cheaper else "cache"
+		return result
+
+	def print_report(self, file = sys.stdout):
+		"""Print report in user friendly format. Functions are sorted by total evaluation time."""
+		report = self.report()
+		print("{:>10} {:>10} {:>10} {:>10} {:>6} {:>6} {:>12}  {}".format(
+			"eval", "hash", "load", "store", "hits", "miss", "size", "name"), file = file)
+		for name, s in sorted(report.items(), key = lambda item: -item[1]["eval"]):
+			print("{:10.4f} {:10.4f} {:10.4f} {:10.4f} {:6} {:6} {:12}  {}".format(
+				s["eval"], s["hash"], s["load"], s["store"], s["hits"], s["misses"], s["size"], name), file = file)
+
+	def to_json(self):
+		return json.dumps({ "events": self.events, "report": self.report() })
+
+	def chrome_trace(self):
+		"""Events in Chrome trace event format."""
+		events = []
+		for e in self.events:
+			args = { k : v for k, v in e.items() if k not in ("event", "name", "start", "duration", "pid", "tid") }
+			events.append({
+				"name": e["name"], "cat": e["event"], "ph": "X",
+				"ts": e["start"] * 1e6, "dur": e["duration"] * 1e6,
+				"pid": e["pid"], "tid": e["tid"], "args": args,
+			})
+		return { "traceEvents": events, "displayTimeUnit": "ms" }
+
+	def dump_chrome_trace(self, path):
+		with open(path, "w") as fl:
+			json.dump(self.chrome_trace(), fl)
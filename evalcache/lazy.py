@@ -2,10 +2,19 @@
 
 from __future__ import print_function
 
-import sys
+import os
+import math
+import time
 import types
+import threading
+import contextlib
+import pickle
 import hashlib
 import binascii
+import weakref
+import warnings
+
+from evalcache.hashing import updatehash, register_hash, endpointhash, functionhash, EvalcacheWarning
 
 class Lazy:
 	"""Decorator for endpoint objects lazifying.
@@ -17,19 +26,103 @@ class Lazy:
 	encache -- default state of enabling cache storing
 	decache -- default state of enabling cache loading
 	diag -- diagnostic output
+	executor -- default concurrent.futures-like executor for parallel unlazy (None - sequential evaluation)
+	keepvalue -- keep evaluation results in lazy objects. Disable it if cache holds values in memory (f.e. MemoryCache).
+	hooks -- instrumentation callbacks (see emit and evalcache.instrument.Profiler).
+	policy -- cache-or-recompute policy (f.e. evalcache.AdaptivePolicy). None - cache all nodes.
+	index -- dependency index of evaluated nodes (see evalcache.DependencyIndex). None - don't record.
+	intern -- hash-consing of nodes. Structurally identical nodes are the same object while it is alive
+		(table holds weak references), so common subexpressions are evaluated once without cache.
+	fuse -- operators construct fused expression nodes (see evalcache.fusion).
+	codehash -- decorated functions' hashes include their bytecode, so editing of function invalidates
+		its cached results. By default function is identified by qualname and module.
 	"""
 
-	def __init__(self, cache, algo = hashlib.sha256, encache = True, decache = True, diag = False):
+	def __init__(self, cache, algo = hashlib.sha256, encache = True, decache = True, diag = False, executor = None, 
+			keepvalue = True, hooks = (), policy = None, index = None, intern = False, fuse = False, 
+			codehash = False):
 		self.cache = cache
 		self.algo = algo
 		self.encache = encache
 		self.decache = decache
 		self.diag = diag
+		self.executor = executor
+		self.keepvalue = keepvalue
+		self.hooks = list(hooks)
+		self.policy = policy
+		self.index = index
+		self.nodes = weakref.WeakValueDictionary() if intern else None
+		self.fuse = fuse
+		self.codehash = codehash
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state["nodes"] = None if self.nodes is None else {}
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		if self.nodes is not None:
+			self.nodes = weakref.WeakValueDictionary()
 
 	def __call__(self, wrapped_object):
-		"""Construct lazy wrap for target object."""
+		"""Construct lazy wrap for target object. 
+		Function's identity hash is evaluated once here (see hashing.function_identity)."""
+		if isinstance(wrapped_object, types.FunctionType):
+			digest = functionhash(self.algo, wrapped_object, self.codehash)
+			return LazyObject(self, value = wrapped_object, digest = digest)
 		return LazyObject(self, value = wrapped_object)
 
+	def map(self, func, iterable, chunksize = 1024, executor = None):
+		"""Construct lazy collection of func results for every element of iterable.
+
+		Every element is cached with the same key as func(element) node, but cache
+		lookups and stores are batched and only missing elements are computed in chunks.
+		See evalcache.vector for details.
+
+		Arguments:
+		----------
+		func -- function or lazy function
+		iterable -- elements (lazy objects can be used)
+		chunksize -- elements count per chunk
+		executor -- concurrent.futures-like executor for chunks evaluation
+		"""
+		from evalcache.vector import lazymap
+		return lazymap(self, func, iterable, chunksize, executor)
+
+	def vectorize(self, func = None, chunksize = 1024):
+		"""Decorator for batched functions, which take list of elements and return list of results.
+
+		Decorated function takes iterable and returns lazy collection (see map).
+		Can be used as @lazy.vectorize or @lazy.vectorize(chunksize = ...)
+		"""
+		from evalcache.vector import Vectorized
+		if func is None:
+			return lambda func: Vectorized(self, func, chunksize)
+		return Vectorized(self, func, chunksize)
+
+	def stream(self, func = None, chunksize = 1000, resumable = False):
+		"""Decorator for generator functions. Decorated function returns lazy stream node.
+
+		Unlazy result of stream node is iterable, which stores generator's output in cache by chunks 
+		while it is consumed, replays stored chunks and resumes interrupted generation after the last
+		stored chunk. See evalcache.stream for details.
+		Can be used as @lazy.stream or @lazy.stream(chunksize = ..., resumable = ...)
+
+		Arguments:
+		----------
+		chunksize -- items count per chunk
+		resumable -- generator takes 'start' keyword argument (index of the first item to produce). 
+			Otherwise generator is restarted on resume and already stored items are skipped.
+		"""
+		from evalcache.stream import StreamFunction
+		if func is None:
+			return lambda func: StreamFunction(self, func, chunksize, resumable)
+		return StreamFunction(self, func, chunksize, resumable)
+
+## Shared frozen kwargs of nodes without keyword arguments.
+EMPTY = types.MappingProxyType({})
+
 class LazyObject:
 	"""Lazytree element's interface.
 
@@ -48,26 +141,73 @@ class LazyObject:
 	kwargs -- call keyword arguments
 	encache -- True if need to store to cache. 
 	value -- force set __lazyvalue__. Uses for endpoint objects.
+	digest -- precomputed hash of endpoint object.
+
+	Lazy trees can contain a huge count of nodes, so LazyObject uses __slots__.
+	Hex representation of hash is evaluated on demand.
+
+	If lazifier interns nodes, construction of existing node (with the same hash and 
+	cache flags) returns the canonical instance, so its value is evaluated once.
 	"""
 
-	def __init__(self, lazifier, generic = None, args = (), kwargs = {}, encache = None, decache = None, value = None): 
+	__slots__ = ("__lazybase__", "__encache__", "__decache__", "generic", "args", "kwargs", 
+		"__lazyvalue__", "__lazyhash__", "__weakref__")
+
+	def __new__(cls, lazifier = None, generic = None, args = (), kwargs = EMPTY, encache = None, decache = None, value = None,
+			digest = None): 
+		self = object.__new__(cls)
+		if lazifier is None:
+			# Unpickling and copying.
+			return self
+
 		self.__lazybase__ = lazifier
 		self.__encache__ = encache if encache is not None else self.__lazybase__.encache
 		self.__decache__ = decache if decache is not None else self.__lazybase__.decache
 
 		self.generic = generic
 		self.args = args
-		self.kwargs = kwargs
+		self.kwargs = kwargs if kwargs else EMPTY
 		self.__lazyvalue__ = value
 
-		m = self.__lazybase__.algo()		
-		if generic is not None: updatehash(m, generic)
-		if len(args): updatehash(m, args)
-		if len(kwargs): updatehash(m, kwargs)
-		if value is not None: updatehash(m, value)
+		hooks = lazifier.hooks
+		if hooks: 
+			start = time.perf_counter()
 
-		self.__lazyhash__ = m.digest()
-		self.__lazyhexhash__ = m.hexdigest()
+		if digest is not None:
+			self.__lazyhash__ = digest
+		elif generic is None and value is not None:
+			self.__lazyhash__ = endpointhash(self.__lazybase__.algo, value)
+		else:
+			m = self.__lazybase__.algo()		
+			if generic is not None: updatehash(m, generic)
+			if len(args): updatehash(m, args)
+			if len(kwargs): updatehash(m, kwargs)
+			if value is not None: updatehash(m, value)
+			self.__lazyhash__ = m.digest()
+
+		if hooks:
+			emit(self, "hash", start, time.perf_counter() - start)
+
+		nodes = lazifier.nodes
+		if nodes is not None:
+			canonical = nodes.setdefault(self.__lazyhash__, self)
+			if (canonical.__encache__ == self.__encache__ and canonical.__decache__ == self.__decache__):
+				return canonical
+		return self
+
+	def __getstate__(self):
+		state = { name : object.__getattribute__(self, name) for name in LazyObject.__slots__[:-1] }
+		state["kwargs"] = dict(self.kwargs)
+		return state
+
+	def __setstate__(self, state):
+		for name, value in state.items():
+			object.__setattr__(self, name, value)
+		self.kwargs = self.kwargs if self.kwargs else EMPTY
+
+	@property
+	def __lazyhexhash__(self):
+		return binascii.hexlify(self.__lazyhash__).decode("ascii")
 
 	#Callable
 	def __call__(self, *args, **kwargs): return LazyObject(self.__lazybase__, self, args, kwargs)
@@ -76,36 +216,36 @@ class LazyObject:
 	def __getattr__(self, item): return LazyObject(self.__lazybase__, getattr, (self, item), encache = False, decache = False)
 	
 	#Arithmetic operators:
-	def __add__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x + y, (self, oth))
-	def __sub__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x - y, (self, oth))
-	def __mul__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x * y, (self, oth))
-	def __floordiv__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x // y, (self, oth))
-	def __div__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x / y, (self, oth))
-	def __truediv__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x / y, (self, oth))
-	def __mod__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x % y, (self, oth))
-	def __divmod__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: divmod(x, y), (self, oth))
-	def __pow__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x ** y, (self, oth))
-	def __lshift__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x << y, (self, oth))
-	def __rshift__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x >> y, (self, oth))
-	def __and__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x & y, (self, oth))
-	def __or__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x | y, (self, oth))
-	def __xor__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x ^ y, (self, oth))
+	def __add__(self, oth): return lazyoperator(self, "{0} + {1}", lambda x,y: x + y, (self, oth))
+	def __sub__(self, oth): return lazyoperator(self, "{0} - {1}", lambda x,y: x - y, (self, oth))
+	def __mul__(self, oth): return lazyoperator(self, "{0} * {1}", lambda x,y: x * y, (self, oth))
+	def __floordiv__(self, oth): return lazyoperator(self, "{0} // {1}", lambda x,y: x // y, (self, oth))
+	def __div__(self, oth): return lazyoperator(self, "{0} / {1}", lambda x,y: x / y, (self, oth))
+	def __truediv__(self, oth): return lazyoperator(self, "{0} / {1}", lambda x,y: x / y, (self, oth))
+	def __mod__(self, oth): return lazyoperator(self, "{0} % {1}", lambda x,y: x % y, (self, oth))
+	def __divmod__(self, oth): return lazyoperator(self, "divmod({0}, {1})", lambda x,y: divmod(x, y), (self, oth))
+	def __pow__(self, oth): return lazyoperator(self, "{0} ** {1}", lambda x,y: x ** y, (self, oth))
+	def __lshift__(self, oth): return lazyoperator(self, "{0} << {1}", lambda x,y: x << y, (self, oth))
+	def __rshift__(self, oth): return lazyoperator(self, "{0} >> {1}", lambda x,y: x >> y, (self, oth))
+	def __and__(self, oth): return lazyoperator(self, "{0} & {1}", lambda x,y: x & y, (self, oth))
+	def __or__(self, oth): return lazyoperator(self, "{0} | {1}", lambda x,y: x | y, (self, oth))
+	def __xor__(self, oth): return lazyoperator(self, "{0} ^ {1}", lambda x,y: x ^ y, (self, oth))
 
 	#Reverse arithmetic operators:
-	def __radd__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x + y, (oth, self))
-	def __rsub__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x - y, (oth, self))
-	def __rmul__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x * y, (oth, self))
-	def __rfloordiv__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x // y, (oth, self))
-	def __rdiv__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x / y, (oth, self))
-	def __rtruediv__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x / y, (oth, self))
-	def __rmod__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x % y, (oth, self))
-	def __rdivmod__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: divmod(x, y), (oth, self))
-	def __rpow__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x**y, (oth, self))
-	def __rlshift__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x << y, (oth, self))
-	def __rrshift__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x >> y, (oth, self))
-	def __rand__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x & y, (oth, self))
-	def __ror__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x | y, (oth, self))
-	def __rxor__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x ^ y, (oth, self))
+	def __radd__(self, oth): return lazyoperator(self, "{0} + {1}", lambda x,y: x + y, (oth, self))
+	def __rsub__(self, oth): return lazyoperator(self, "{0} - {1}", lambda x,y: x - y, (oth, self))
+	def __rmul__(self, oth): return lazyoperator(self, "{0} * {1}", lambda x,y: x * y, (oth, self))
+	def __rfloordiv__(self, oth): return lazyoperator(self, "{0} // {1}", lambda x,y: x // y, (oth, self))
+	def __rdiv__(self, oth): return lazyoperator(self, "{0} / {1}", lambda x,y: x / y, (oth, self))
+	def __rtruediv__(self, oth): return lazyoperator(self, "{0} / {1}", lambda x,y: x / y, (oth, self))
+	def __rmod__(self, oth): return lazyoperator(self, "{0} % {1}", lambda x,y: x % y, (oth, self))
+	def __rdivmod__(self, oth): return lazyoperator(self, "divmod({0}, {1})", lambda x,y: divmod(x, y), (oth, self))
+	def __rpow__(self, oth): return lazyoperator(self, "{0} ** {1}", lambda x,y: x**y, (oth, self))
+	def __rlshift__(self, oth): return lazyoperator(self, "{0} << {1}", lambda x,y: x << y, (oth, self))
+	def __rrshift__(self, oth): return lazyoperator(self, "{0} >> {1}", lambda x,y: x >> y, (oth, self))
+	def __rand__(self, oth): return lazyoperator(self, "{0} & {1}", lambda x,y: x & y, (oth, self))
+	def __ror__(self, oth): return lazyoperator(self, "{0} | {1}", lambda x,y: x | y, (oth, self))
+	def __rxor__(self, oth): return lazyoperator(self, "{0} ^ {1}", lambda x,y: x ^ y, (oth, self))
 
 	#Compare operators:
 	#Is not supported as lazy operations
@@ -119,21 +259,21 @@ class LazyObject:
 	#def __ge__(self, oth): return LazyObject(self.__lazybase__, lambda x,y: x >= y, (self, oth))
 
 	#Unary operators:
-	def __pos__(self): return LazyObject(self.__lazybase__, lambda x: +x, (self))
-	def __neg__(self): return LazyObject(self.__lazybase__, lambda x: -x, (self))
-	def __abs__(self): return LazyObject(self.__lazybase__, lambda x: abs(x), (self))
-	def __invert__(self): return LazyObject(self.__lazybase__, lambda x: ~x, (self))
+	def __pos__(self): return lazyoperator(self, "+{0}", lambda x: +x, (self,))
+	def __neg__(self): return lazyoperator(self, "-{0}", lambda x: -x, (self,))
+	def __abs__(self): return lazyoperator(self, "abs({0})", lambda x: abs(x), (self,))
+	def __invert__(self): return lazyoperator(self, "~{0}", lambda x: ~x, (self,))
 	def __round__(self, n): return LazyObject(self.__lazybase__, lambda x, y: round(x, y), (self, n))
-	def __floor__(self): return LazyObject(self.__lazybase__, lambda x: math.floor(x), (self))
-	def __ceil__(self): return LazyObject(self.__lazybase__, lambda x: math.ceil(x), (self))
-	def __trunc__(self): return LazyObject(self.__lazybase__, lambda x: math.trunc(x), (self))
+	def __floor__(self): return LazyObject(self.__lazybase__, lambda x: math.floor(x), (self,))
+	def __ceil__(self): return LazyObject(self.__lazybase__, lambda x: math.ceil(x), (self,))
+	def __trunc__(self): return LazyObject(self.__lazybase__, lambda x: math.trunc(x), (self,))
 
 	#Augmented assignment
 	#This methods group are not supported
 
 	#Container methods:
 	#def __len__(self): print("LEN"); exit(0); return LazyObject(self.__lazybase__, lambda x: len(x), (self))
-	def __getitem__(self, item): return LazyObject(self.__lazybase__, lambda x, i: x[i], (self, item))
+	def __getitem__(self, item): return lazyoperator(self, "{0}[{1}]", lambda x, i: x[i], (self, item))
 	#def __setitem__(self, key, value) --- Not supported
 	#def __delitem__(self, key)--- Not supported
 	def __iter__(self): return LazyObject(self.__lazybase__, lambda x: iter(x), (self))
@@ -169,7 +309,12 @@ class LazyObject:
 			return self
 	def __delete__(self): pass
 
-	def unlazy(self):
+	def aunlazy(self):
+		"""Get a result of evaluation in asyncio event loop. See evalcache.aio.aunlazy."""
+		from evalcache.aio import aunlazy
+		return aunlazy(self)
+
+	def unlazy(self, executor = None):
 		"""Get a result of evaluation.
 
 		See .unlazy function for details.
@@ -178,150 +323,336 @@ class LazyObject:
 		Technically, the evaluated object can define an "unlazy" method.
 		If so, we'll hide such the method. However since using the unlazy 
 		function is more convenient as the method, so this option was excluded."""		
-		ret = unlazy(self)
+		ret = unlazy(self, executor)
 		if hasattr(ret, "unlazy"):
-			print("WARNING: Shadow unlazy method.")
+			warnings.warn("unlazy method of evaluated object is shadowed", EvalcacheWarning, stacklevel = 2)
 		return ret
 
+def lazyoperator(obj, template, func, args):
+	"""Construct operator node. If lazifier fuses operators, expression node is constructed, 
+	template is str.format pattern of expression (see evalcache.fusion)."""
+	if obj.__lazybase__.fuse:
+		from evalcache.fusion import fuse
+		return fuse(obj.__lazybase__, template, args)
+	return LazyObject(obj.__lazybase__, func, args)
+
 def lazydo(obj):
-	"""Perform evaluation.
+	"""Perform evaluation of node. All node's dependencies should be evaluated (see evaluate).
 
-	We need expand all arguments and callable for support lazy trees.
 	Such we should expand result becourse it can be LazyObject (f.e. lazy functions in lazy functions)
 	"""
-	func = expand(obj.generic)
-	args = expand(obj.args)
-	kwargs = expand(obj.kwargs)
+	func = substitute(obj.generic)
+	args = substitute(obj.args)
+	kwargs = substitute(obj.kwargs)
 	result = expand(func(*args, **kwargs)) 
 	return result
 
-def unlazy(obj):
+def substitute(arg, values = None):
+	"""Same as .expand for evaluated subtrees. Lazy objects are replaced with their __lazyvalue__
+	or with values from 'values' table by id. Mappings (f.e. EMPTY kwargs) become dicts, so 
+	result can be pickled for ProcessPoolExecutor."""
+	if isinstance(arg, list) or isinstance(arg, tuple): return [ substitute(a, values) for a in arg ]
+	elif isinstance(arg, dict) or isinstance(arg, types.MappingProxyType): 
+		return { substitute(k, values) : substitute(v, values) for k, v in arg.items() }
+	elif isinstance(arg, LazyObject): return arg.__lazyvalue__ if values is None else values[id(arg)]
+	else: return arg
+
+def reachable(roots):
+	"""Hex hashes of all nodes of lazy trees. Generic can add cache keys of node's parts
+	by __evalcache_keys__ method (f.e. elements of lazy map, see vector.Mapper)."""
+	result = set()
+	stack = list(roots)
+	while stack:
+		obj = stack.pop()
+		if obj.__lazyhexhash__ in result:
+			continue
+		result.add(obj.__lazyhexhash__)
+		extra = None if isinstance(obj.generic, LazyObject) else getattr(obj.generic, "__evalcache_keys__", None)
+		if extra is not None:
+			result.update(extra())
+		stack.extend(dependencies(obj))
+	return result
+
+def dependencies(obj):
+	"""Lazy objects from node's generic and arguments in evaluation order."""
+	return lazyitems((obj.generic, obj.args, obj.kwargs))
+
+def lazyitems(arg):
+	"""Lazy objects from argument and its items (same traversal as in .expand)."""
+	out = []
+	stack = [arg]
+	while stack:
+		arg = stack.pop()
+		if isinstance(arg, LazyObject): out.append(arg)
+		elif isinstance(arg, list) or isinstance(arg, tuple): stack.extend(reversed(arg))
+		elif isinstance(arg, dict):
+			for k, v in reversed(list(arg.items())):
+				stack.append(v)
+				stack.append(k)
+	return out
+
+def evaluate(root):
+	"""Evaluate lazy tree without recursion.
+
+	Nodes are visited in post-order with explicit stack, so the tree depth is not limited
+	by interpreter's recursion limit. Equal nodes are evaluated once per pass.
+	"""
+	values = {}
+	visited = []
+	stack = [(root, False)]
+	while stack:
+		obj, ready = stack.pop()
+		if ready:
+			lazycompute(obj)
+			values[obj.__lazyhash__] = obj.__lazyvalue__
+			continue
+
+		if obj is not root:
+			visited.append(obj)
+			if obj.__lazyvalue__ is None and obj.__lazyhash__ in values:
+				obj.__lazyvalue__ = values[obj.__lazyhash__]
+				continue
+			if lazyload(obj):
+				values[obj.__lazyhash__] = obj.__lazyvalue__
+				continue
+
+		stack.append((obj, True))
+		stack.extend((dep, False) for dep in reversed(dependencies(obj)))
+
+	for obj in visited:
+		lazyrelease(obj)
+
+def unlazy(obj, executor = None):
 	"""Get a result of evaluation.
 
 	This function searches for the result in local memory, and after that in cache.
 	If object wasn't stored early, it performs evaluation and stores a result in cache and local memory.
 	If object has disabled __encache__ storing prevented.
 	If object has disabled __decache__ loading prevented.
+
+	If executor (concurrent.futures-like) is specified or setted in lazifier, the tree is evaluated
+	by parallel scheduler. See evalcache.scheduler for details. If executor is evalcache.Cluster,
+	the tree is evaluated by its workers (see evalcache.distributed).
 	"""
-	diagnostic = obj.__lazybase__.diag
-	def diag(t): 
-		if diagnostic: 
-			print(t, obj.__lazyhexhash__) 
+	if executor is None:
+		executor = obj.__lazybase__.executor
 
+	if not lazyload(obj):
+		if executor is not None and hasattr(executor, "unlazy"):
+			# Distributed evaluation (see evalcache.Cluster). Workers write to cache concurrently.
+			return executor.unlazy(obj)
+
+		with cachebatch(obj.__lazybase__.cache), cachebatch(obj.__lazybase__.index):
+			if executor is not None:
+				from evalcache.scheduler import unlazy_parallel
+				return unlazy_parallel(obj, executor)
+
+			# Object wasn't stored early. Evaluate it. Store it if not prevented.
+			evaluate(obj)
+
+	# And, anyway, here our object in obj.__lazyvalue__
+	return lazyrelease(obj)
+
+def lazycompute(obj):
+	"""Evaluate node and store result.
+
+	If cache supports cross-process locking, node's key is locked during evaluation,
+	so concurrent processes don't compute the same node twice: the first one computes it,
+	the others wait and load the result.
+	"""
+	lock = lazylock(obj)
+	if lock is None:
+		lazysave(obj, *timedo(obj))
+		return
+
+	with lock:
+		# Another process could evaluate the node while we were waiting.
+		if not lazyload(obj):
+			lazysave(obj, *timedo(obj))
+
+def timedo(obj):
+	"""Perform evaluation of node. Returns result and evaluation time in seconds."""
+	start = time.perf_counter()
+	value = lazydo(obj)
+	return value, time.perf_counter() - start
+
+def lazylock(obj):
+	"""Cache's lock of node's key (f.e. DirCache.lock) if cache supports it, else None."""
+	policy = obj.__lazybase__.policy
+	if not obj.__encache__ or (policy is not None and not policy.cached(obj)):
+		return None
+	lock = getattr(obj.__lazybase__.cache, "lock", None)
+	return lock(obj.__lazyhexhash__) if lock is not None else None
+
+def cachebatch(cache):
+	"""Cache's (or index's) batch context (f.e. SqliteCache transaction) if it is supported."""
+	batch = getattr(cache, "batch", None)
+	return batch() if batch is not None else contextlib.nullcontext()
+
+def emit(obj, event, start, duration, **data):
+	"""Send instrumentation event to lazifier's hooks.
+
+	Event is a dict with fields: 
+	event -- "hash", "lookup", "load", "eval" or "store"
+	key -- node's hex hash
+	name -- qualname of node's generic (see genericname)
+	start -- time.perf_counter() based start time in seconds
+	duration -- duration in seconds
+	pid, tid -- process and thread identifiers
+	hit -- lookup result ("lookup" only)
+	size -- pickled size of value in bytes, None if value is unpicklable ("store" only)
+	"""
+	hooks = obj.__lazybase__.hooks
+	if not hooks:
+		return
+
+	record = { 
+		"event": event, "key": obj.__lazyhexhash__, "name": genericname(obj), 
+		"start": start, "duration": duration, "pid": os.getpid(), "tid": threading.get_ident() 
+	}
+	record.update(data)
+	for hook in hooks:
+		hook(record)
+
+def genericname(obj):
+	"""Qualname of node's generic function for cost attribution."""
+	generic = obj.generic
+	if generic is None:
+		return "<endpoint>"
+	if isinstance(generic, LazyObject):
+		if generic.generic is not None or generic.__lazyvalue__ is None:
+			return "<lazy>"
+		generic = generic.__lazyvalue__
+	return getattr(generic, "__qualname__", generic.__class__.__qualname__)
+
+def pickled_size(value):
+	"""Serialized size of value. None if value can't be pickled (f.e. closure in memory cache)."""
+	try:
+		return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+	except (pickle.PicklingError, TypeError, AttributeError):
+		return None
+
+def diag(obj, t):
+	"""Print diagnostic message if lazifier diag mode enabled."""
+	if obj.__lazybase__.diag: 
+		print(t, obj.__lazyhexhash__) 
+
+def lazyload(obj):
+	"""Try to get a result without evaluation.
+
+	Searches for the result in local memory, and after that in cache (if not prevented).
+	Returns True if obj.__lazyvalue__ is setted.
+	"""
 	# If local context was setted we can return object imediatly
 	if (obj.__lazyvalue__ is not None):
 		# Load from local context ...
 		if obj.generic is None:
 			# for endpoint object.
-			diag('endp') 
+			diag(obj, 'endp') 
 		else:
 			# for early executed object.
-			diag('fget')				
+			diag(obj, 'fget')				
+		return True
 	
 	# Now searhes object in cache, if not prevented.
-	elif obj.__decache__ and obj.__lazyhexhash__ in obj.__lazybase__.cache:
-		# Load from cache.
-		diag('load')
-		obj.__lazyvalue__ = obj.__lazybase__.cache[obj.__lazyhexhash__]
-	
-	# Object wasn't stored early. Evaluate it. Store it if not prevented.
+	policy = obj.__lazybase__.policy
+	if obj.__decache__ and (policy is None or policy.cached(obj)):
+		cache = obj.__lazybase__.cache
+		key = obj.__lazyhexhash__
+
+		start = time.perf_counter()
+		found = key in cache
+		emit(obj, "lookup", start, time.perf_counter() - start, hit = found)
+
+		if found:
+			# Load from cache.
+			diag(obj, 'load')
+			start = time.perf_counter()
+			obj.__lazyvalue__ = cache[key]
+			duration = time.perf_counter() - start
+			emit(obj, "load", start, duration)
+			if policy is not None:
+				policy.record(obj, "load", duration)
+			return True
+
+	return False
+
+def lazyrelease(obj):
+	"""Return obj.__lazyvalue__. Forget it if lazifier doesn't keep values (endpoint objects are kept)."""
+	value = obj.__lazyvalue__
+	if not obj.__lazybase__.keepvalue and obj.generic is not None:
+		obj.__lazyvalue__ = None
+	return value
+
+def lazysave(obj, value, cost = None):
+	"""Set evaluation result to local memory and store it in cache if not prevented.
+
+	If cost (evaluation time in seconds) is specified and cache supports it (see DirCache.setcost), 
+	it is stored too. Node's edges are recorded in lazifier's dependency index.
+	"""
+	obj.__lazyvalue__ = value		
+	policy = obj.__lazybase__.policy
+	if obj.__lazybase__.index is not None:
+		obj.__lazybase__.index.record(obj)
+	if cost is not None:
+		emit(obj, "eval", time.perf_counter() - cost, cost)
+		if policy is not None:
+			policy.record(obj, "eval", cost)
+
+	if obj.__encache__ and (policy is None or policy.cached(obj)):
+		# with storing.
+		diag(obj, 'save')
+		cache = obj.__lazybase__.cache
+		start = time.perf_counter()
+		cache[obj.__lazyhexhash__] = value
+		duration = time.perf_counter() - start
+		if obj.__lazybase__.hooks:
+			emit(obj, "store", start, duration, size = pickled_size(value))
+		if policy is not None:
+			policy.record(obj, "store", duration, value)
+		setcost = getattr(cache, "setcost", None)
+		if setcost is not None and cost is not None:
+			setcost(obj.__lazyhexhash__, cost)
 	else:
-		# Execute ...
-		obj.__lazyvalue__ = lazydo(obj)		
-		if obj.__encache__:
-			# with storing.
-			diag('save')
-			obj.__lazybase__.cache[obj.__lazyhexhash__] = obj.__lazyvalue__
-		else:
-			# without storing.
-			diag('eval')
+		# without storing.
+		diag(obj, 'eval')
 
-	# And, anyway, here our object in obj.__lazyvalue__
-	return obj.__lazyvalue__
-
-def expand(arg):
+def expand(arg, executor = None):
 	"""Apply unlazy operation for argument or for all argument's items if need.
 	LazyObject as dictionary key can be used.
 
 	TODO: Need construct expand functions table for compat with user's collections.
 	"""
-	if isinstance(arg, list) or isinstance(arg, tuple): return [ expand(a) for a in arg ]
-	elif isinstance(arg, dict) : return { expand(k) : expand(v) for k, v in arg.items() }
-	else: return unlazy(arg) if isinstance(arg, LazyObject) else arg
-
-def updatehash_list(m, obj):
-	for e in obj:
-		updatehash(m, e)
-
-def updatehash_dict(m, obj):
-	for k, v in sorted(obj.items()):
-		updatehash(m, k)
-		updatehash(m, v)
+	if isinstance(arg, list) or isinstance(arg, tuple): return [ expand(a, executor) for a in arg ]
+	elif isinstance(arg, dict) : return { expand(k, executor) : expand(v, executor) for k, v in arg.items() }
+	else: return unlazy(arg, executor) if isinstance(arg, LazyObject) else arg
 
 def updatehash_LazyObject(m, obj):
 	m.update(obj.__lazyhash__)
 
-def updatehash_function(m, obj):
-	if hasattr(obj, "__qualname__"):
-		if obj.__qualname__ == "<lambda>":
-			print("WARNING: evalcache cann't work with global lambdas correctly")
-		m.update(obj.__qualname__.encode("utf-8"))
-	elif hasattr(obj, "__name__"): 
-		m.update(obj.__name__.encode("utf-8"))
-	if hasattr(obj, "__module__") and obj.__module__: 
-		m.update(obj.__module__.encode("utf-8"))
-		m.update(sys.modules[obj.__module__].__file__.encode("utf-8"))
-
-## Table of hash functions for special types.
-hashfuncs = {
-	LazyObject: updatehash_LazyObject,
-	tuple: updatehash_list,
-	list: updatehash_list,
-	dict: updatehash_dict,
-	types.FunctionType: updatehash_function,
-}
-
-def updatehash(m, obj):
-	"""Update hash in hashlib-like algo with hashable object
-
-	As usual we use hash of object representation, but for special types we can set
-	special updatehash functions (see 'hashfuncs' table).
-
-	Warn: If you use changing between program starts object representation (f.e. object.__repr__)
-	for hashing, this library will not be work corectly. 
-
-	Arguments
-	---------
-	m -- hashlib-like algorithm instance.
-	obj -- hashable object
-	"""
-	if obj.__class__ in hashfuncs:
-		hashfuncs[obj.__class__](m, obj)
-	else:
-		if obj.__class__.__repr__ is object.__repr__:
-			print("WARNING: object of class {} uses common __repr__ method. Сache may not work correctly"
-				.format(obj.__class__))
-		m.update(repr(obj).encode("utf-8"))
-
-
+register_hash(LazyObject, updatehash_LazyObject)
 
 __tree_tab = "    "
 def print_tree(obj, t = 0):
 	"""Print lazy tree in user friendly format."""	
-	if isinstance(obj, LazyObject):
-		#print(__tree_tab*t, end=''); print("LazyObject:")
-		if (obj.generic): 
-			print(__tree_tab*t, end=''); print("generic:\n", end=''); print_tree(obj.generic, t+1)
-			if (len(obj.args)): print(__tree_tab*t, end=''); print("args:\n", end=''); print_tree(obj.args, t+1)
-			if (len(obj.kwargs)): print(__tree_tab*t, end=''); print("kwargs:\n", end=''); print_tree(obj.kwargs, t+1)
-			print(__tree_tab*t, end=''); print("-------")
+	stack = [(obj, t, False)]
+	while stack:
+		obj, t, text = stack.pop()
+		if text:
+			print(__tree_tab*t, end=''); print(obj)
+		elif isinstance(obj, LazyObject):
+			if (obj.generic): 
+				items = [("generic:", t, True), (obj.generic, t+1, False)]
+				if (len(obj.args)): items += [("args:", t, True), (obj.args, t+1, False)]
+				if (len(obj.kwargs)): items += [("kwargs:", t, True), (obj.kwargs, t+1, False)]
+				items.append(("-------", t, True))
+				stack.extend(reversed(items))
+			else:
+				print(__tree_tab*t, end=''); print(obj.__lazyvalue__)
+		elif isinstance(obj, list) or isinstance(obj, tuple):
+			stack.extend((o, t, False) for o in reversed(obj))
 		else:
-			print(__tree_tab*t, end=''); print(obj.__lazyvalue__)
-	elif isinstance(obj, list) or isinstance(obj, tuple):
-		for o in obj:
-			print_tree(o, t)
-	else:
-		print(__tree_tab*t, end=''); print(obj)
+			print(__tree_tab*t, end=''); print(obj)
 
 def encache(obj, sts = True):
 	obj.__encache__ = sts
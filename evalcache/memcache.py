@@ -0,0 +1,283 @@
+#coding: utf-8
+
+import queue
+import atexit
+import threading
+import contextlib
+import collections
+
+from evalcache.lazy import cachebatch, pickled_size
+
+class MemoryCache:
+	"""Dict-like in-memory cache with LRU eviction and bytes budget.
+
+	Values are stored as is. Their size is estimated by pickled representation, only if bytes budget
+	is specified. With budget values of unknown size (unpicklable) aren't kept.
+
+	Arguments:
+	----------
+	maxsize -- bytes budget (None - unlimited)
+	maxcount -- entries budget (None - unlimited)
+	sizeof -- function for value size estimation (pickled size by default)
+	"""
+
+	def __init__(self, maxsize = None, maxcount = None, sizeof = pickled_size):
+		self.maxsize = maxsize
+		self.maxcount = maxcount
+		self.sizeof = sizeof
+
+		self.entries = collections.OrderedDict()
+		self.size = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def __contains__(self, key):
+		if key in self.entries:
+			return True
+		self.misses += 1
+		return False
+
+	def __getitem__(self, key):
+		try:
+			value, _ = self.entries[key]
+		except KeyError:
+			self.misses += 1
+			raise
+		self.entries.move_to_end(key)
+		self.hits += 1
+		return value
+
+	def __setitem__(self, key, value):
+		size = self.sizeof(value) if self.maxsize is not None else 0
+		if key in self.entries:
+			del self[key]
+		if self.maxsize is not None and (size is None or size > self.maxsize):
+			return
+
+		self.entries[key] = (value, size)
+		self.size += size
+		self.evict()
+
+	def __delitem__(self, key):
+		_, size = self.entries.pop(key)
+		self.size -= size
+
+	def __len__(self):
+		return len(self.entries)
+
+	def evict(self):
+		"""Drop least recently used entries while budget is exceeded."""
+		while ((self.maxsize is not None and self.size > self.maxsize)
+				or (self.maxcount is not None and len(self.entries) > self.maxcount)):
+			_, (_, size) = self.entries.popitem(last = False)
+			self.size -= size
+			self.evictions += 1
+
+	def clear(self):
+		self.entries.clear()
+		self.size = 0
+
+	def stats(self):
+		return {
+			"hits": self.hits,
+			"misses": self.misses,
+			"evictions": self.evictions,
+			"entries": len(self.entries),
+			"size": self.size,
+		}
+
+class ChainCache:
+	"""Dict-like chain of caches from the fastest to the slowest 
+	(f.e. MemoryCache -> DirCache -> HttpCache).
+
+	Values are searched from the fastest tier. Values found in slower tier are promoted to faster tiers.
+	In write-through mode values are stored in all tiers before return. In write-back mode values
+	are stored in the first tier, and are written to other tiers by background thread, so unlazy
+	doesn't wait for slow tiers (see flush). Pending values are visible for reading.
+
+	batch contexts of all tiers are joined. Cross-process lock is taken from the slowest tier which
+	supports it. In write-back mode another process can see the node unlocked before its value
+	reaches shared tier, so the node can be evaluated twice.
+
+	Arguments:
+	----------
+	tiers -- dict-like caches from the fastest to the slowest
+	writeback -- asynchronous writing to tiers except the first
+	"""
+
+	def __init__(self, tiers, writeback = False):
+		self.tiers = list(tiers)
+		self.writeback = writeback
+		self.hits = [0] * len(self.tiers)
+		self.misses = [0] * len(self.tiers)
+
+		self.pending = {}
+		self.mutex = threading.Lock()
+		self.error = None
+		self.located = threading.local()
+		if writeback:
+			self.queue = queue.Queue()
+			self.thread = threading.Thread(target = self.writer, daemon = True)
+			self.thread.start()
+			atexit.register(self.flush)
+
+	def find(self, key, count = False):
+		"""Index of the fastest tier, which contains key, or None. Lookups are counted in tiers statistics."""
+		for i, tier in enumerate(self.tiers):
+			if key in tier:
+				if count: self.hits[i] += 1
+				return i
+			if count: self.misses[i] += 1
+		return None
+
+	def __contains__(self, key):
+		if key in self.pending:
+			return True
+		index = self.find(key, count = True)
+		self.located.key, self.located.index = key, index
+		return index is not None
+
+	def __getitem__(self, key):
+		with self.mutex:
+			if key in self.pending:
+				return self.pending[key]
+
+		# Tier found by preceding __contains__ is read first, lookups are already counted.
+		if getattr(self.located, "key", None) == key and self.located.index is not None:
+			index = self.located.index
+			self.located.key = None
+			try:
+				return self.promote(key, self.tiers[index][key], index)
+			except KeyError:
+				pass
+
+		for i, tier in enumerate(self.tiers):
+			try:
+				value = tier[key]
+			except KeyError:
+				self.misses[i] += 1
+				continue
+			self.hits[i] += 1
+			return self.promote(key, value, i)
+		raise KeyError(key)
+
+	def promote(self, key, value, index):
+		"""Store value found in tier index to faster tiers."""
+		for tier in self.tiers[:index]:
+			tier[key] = value
+		return value
+
+	def __setitem__(self, key, value):
+		if not self.writeback:
+			for tier in reversed(self.tiers):
+				tier[key] = value
+			return
+
+		self.tiers[0][key] = value
+		if len(self.tiers) > 1:
+			with self.mutex:
+				self.pending[key] = value
+			self.queue.put((key, value))
+
+	def __delitem__(self, key):
+		self.flush()
+		found = False
+		for tier in self.tiers:
+			if key in tier:
+				del tier[key]
+				found = True
+		if not found:
+			raise KeyError(key)
+
+	def get_many(self, keys):
+		"""Load values for many keys tier by tier (batched if tier supports it). 
+		Returns dict with found pairs only."""
+		from evalcache.vector import get_many, put_many
+		with self.mutex:
+			result = { key : self.pending[key] for key in keys if key in self.pending }
+		missing = [ key for key in keys if key not in result ]
+
+		for i, tier in enumerate(self.tiers):
+			if not missing:
+				break
+			found = get_many(tier, missing)
+			self.hits[i] += len(found)
+			self.misses[i] += len(missing) - len(found)
+			if found:
+				for faster in self.tiers[:i]:
+					put_many(faster, found.items())
+				result.update(found)
+				missing = [ key for key in missing if key not in found ]
+		return result
+
+	def writer(self):
+		"""Background write-back loop."""
+		while True:
+			key, value = self.queue.get()
+			try:
+				for tier in reversed(self.tiers[1:]):
+					tier[key] = value
+			except Exception as error:
+				self.error = error
+			finally:
+				with self.mutex:
+					if self.pending.get(key) is value:
+						del self.pending[key]
+				self.queue.task_done()
+
+	def flush(self):
+		"""Wait until all pending values are written. Reraises error of background writing."""
+		if self.writeback:
+			self.queue.join()
+		error, self.error = self.error, None
+		if error is not None:
+			raise error
+
+	def batch(self):
+		stack = contextlib.ExitStack()
+		for tier in self.tiers:
+			stack.enter_context(cachebatch(tier))
+		return stack
+
+	def lock(self, key):
+		for tier in reversed(self.tiers):
+			lock = getattr(tier, "lock", None)
+			if lock is not None:
+				return lock(key)
+		return None
+
+	def setcost(self, key, cost):
+		for tier in self.tiers:
+			setcost = getattr(tier, "setcost", None)
+			if setcost is not None:
+				setcost(key, cost)
+
+	def stats(self):
+		"""Hit/miss counters of tiers from the fastest."""
+		result = []
+		for tier, hits, misses in zip(self.tiers, self.hits, self.misses):
+			result.append({
+				"tier": tier.__class__.__name__,
+				"hits": hits,
+				"misses": misses,
+				"hitrate": hits / (hits + misses) if hits + misses else None,
+			})
+		return result
+
+class TieredCache(ChainCache):
+	"""Dict-like composition of fast front cache (f.e. MemoryCache) and slow back cache (f.e. DirCache).
+
+	Values are stored in both caches. Values loaded from back cache are promoted to front cache.
+	It is ChainCache([front, back]).
+
+	Arguments:
+	----------
+	front -- fast dict-like cache
+	back -- slow dict-like cache
+	"""
+
+	def __init__(self, front, back):
+		ChainCache.__init__(self, [front, back])
+		self.front = front
+		self.back = back
@@ -0,0 +1,279 @@
+#coding: utf-8
+
+"""Pack files: many cache entries in one indexed file.
+
+Pack is append-only. It starts with magic and contains records, index and trailer:
+record -- key length (u16), entry length (u64), key (utf-8), padding, serialized entry (see evalcache.codec).
+	Entries are aligned by 64 bytes, so BufferCodec entries are loaded without copying.
+index -- open addressing hash table of (key's hash u64, record offset u64) slots.
+trailer -- index offset (u64), slots count (u64), records count (u64), index magic.
+
+Appending writes new records, new index and new trailer after the old trailer, so readers
+of old version are never broken. PackCache memory-maps pack and finds entries by index.
+
+evalcache pack PACKPATH DIRPATH [--keys FILE]
+evalcache unpack PACKPATH DIRPATH
+evalcache list PACKPATH
+(or python3 -m evalcache ...)
+"""
+
+import os
+import sys
+import mmap
+import struct
+import hashlib
+import argparse
+
+from evalcache.codec import MAGIC, mapped, dumps_entry, loads_entry, decoder
+from evalcache.lazy import reachable
+
+PACK_MAGIC = b"EVCPACK1"
+INDEX_MAGIC = b"EVCPIDX1"
+ALIGN = 64
+
+record = struct.Struct("<HQ")
+slot = struct.Struct("<QQ")
+trailer = struct.Struct("<QQQ8s")
+
+def keyhash(key):
+	"""Nonzero 64 bit hash of key for index."""
+	h = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size = 8).digest(), "little")
+	return h or 1
+
+def read_index(mm):
+	"""Records of pack: dict key -> (record offset, entry offset, entry length)."""
+	if len(mm) < len(PACK_MAGIC) + trailer.size or mm[:len(PACK_MAGIC)] != PACK_MAGIC:
+		raise ValueError("not an evalcache pack file")
+	offset, slots, count, magic = trailer.unpack_from(mm, len(mm) - trailer.size)
+	if magic != INDEX_MAGIC:
+		raise ValueError("pack file is truncated")
+
+	result = {}
+	for i in range(slots):
+		h, pos = slot.unpack_from(mm, offset + i * slot.size)
+		if h:
+			key, start, size = read_record(mm, pos)
+			result[key] = (pos, start, size)
+	return result
+
+def read_record(mm, pos):
+	keysize, size = record.unpack_from(mm, pos)
+	pos += record.size
+	key = bytes(mm[pos : pos + keysize]).decode("utf-8")
+	pos += keysize
+	pos += -pos % ALIGN
+	return key, pos, size
+
+class PackWriter:
+	"""Appending writer of pack file. Keys, which are stored already, are skipped.
+
+	with PackWriter(path) as writer:
+		writer.add(key, data)
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		self.records = {}
+		if os.path.exists(path) and os.path.getsize(path) > 0:
+			with open(path, "rb") as fl, mmap.mmap(fl.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+				for key, (pos, _, _) in read_index(mm).items():
+					self.records[key] = pos
+			self.fl = open(path, "r+b")
+			self.fl.seek(0, os.SEEK_END)
+		else:
+			self.fl = open(path, "wb")
+			self.fl.write(PACK_MAGIC)
+		self.added = 0
+
+	def __contains__(self, key):
+		return key in self.records
+
+	def add(self, key, data):
+		"""Append serialized entry (see evalcache.codec). Returns False if key is in pack already."""
+		if key in self.records:
+			return False
+		encoded = key.encode("utf-8")
+		pos = self.fl.tell()
+		self.fl.write(record.pack(len(encoded), len(data)))
+		self.fl.write(encoded)
+		self.fl.write(b"\0" * (-self.fl.tell() % ALIGN))
+		self.fl.write(data)
+		self.records[key] = pos
+		self.added += 1
+		return True
+
+	def close(self):
+		"""Write index and trailer."""
+		slots = 8
+		while slots < 2 * len(self.records):
+			slots *= 2
+		table = [ (0, 0) ] * slots
+		for key, pos in self.records.items():
+			h = keyhash(key)
+			i = h & (slots - 1)
+			while table[i][0]:
+				i = (i + 1) & (slots - 1)
+			table[i] = (h, pos)
+
+		self.fl.write(b"\0" * (-self.fl.tell() % 8))
+		offset = self.fl.tell()
+		self.fl.write(b"".join(slot.pack(h, pos) for h, pos in table))
+		self.fl.write(trailer.pack(offset, slots, len(self.records), INDEX_MAGIC))
+		self.fl.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+class PackCache:
+	"""Read-only dict-like cache over memory-mapped pack file.
+
+	Stores are ignored, so PackCache can be the last tier of ChainCache or can be used
+	as warm cache of lazifier directly (missing nodes are evaluated, but not stored).
+
+	Arguments:
+	----------
+	path -- pack file path
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		self.fl = open(path, "rb")
+		self.mm = mmap.mmap(self.fl.fileno(), 0, access = mmap.ACCESS_READ)
+		if self.mm[:len(PACK_MAGIC)] != PACK_MAGIC:
+			raise ValueError("not an evalcache pack file")
+		self.offset, self.slots, self.count, magic = trailer.unpack_from(self.mm, len(self.mm) - trailer.size)
+		if magic != INDEX_MAGIC:
+			raise ValueError("pack file is truncated")
+
+	def locate(self, key):
+		"""Offset and length of key's entry or None."""
+		h = keyhash(key)
+		mask = self.slots - 1
+		i = h & mask
+		while True:
+			sh, pos = slot.unpack_from(self.mm, self.offset + i * slot.size)
+			if sh == 0:
+				return None
+			if sh == h:
+				name, start, size = read_record(self.mm, pos)
+				if name == key:
+					return start, size
+			i = (i + 1) & mask
+
+	def __contains__(self, key):
+		return self.locate(key) is not None
+
+	def __getitem__(self, key):
+		found = self.locate(key)
+		if found is None:
+			raise KeyError(key)
+		start, size = found
+		head = self.mm[start : start + len(MAGIC) + 1]
+		if len(head) == len(MAGIC) + 1 and head[:len(MAGIC)] == MAGIC and head[-1] in mapped:
+			# Zero-copy load from mapped file.
+			with open(self.path, "rb") as fl:
+				fl.seek(start + len(MAGIC) + 1)
+				return decoder(head[-1]).load(fl)
+		return loads_entry(self.mm[start : start + size])
+
+	def __setitem__(self, key, value):
+		pass
+
+	def raw(self, key):
+		"""Serialized entry of key."""
+		found = self.locate(key)
+		if found is None:
+			raise KeyError(key)
+		start, size = found
+		return self.mm[start : start + size]
+
+	def get_many(self, keys):
+		return { key : self[key] for key in keys if key in self }
+
+	def keys(self):
+		return list(read_index(self.mm))
+
+	def __iter__(self):
+		return iter(self.keys())
+
+	def __len__(self):
+		return self.count
+
+	def close(self):
+		self.mm.close()
+		self.fl.close()
+
+def selected(cache, roots = None, keys = None):
+	"""Keys of cache's entries to pack. Entries reachable from lazy trees 'roots' (with stream chunks),
+	or listed 'keys', or all entries."""
+	if keys is not None:
+		return [ key for key in keys if key in cache ]
+	if roots is None:
+		return list(cache.keys())
+	keep = reachable(roots)
+	if hasattr(cache, "keys"):
+		return [ key for key in cache.keys() if key.split(".", 1)[0] in keep ]
+	return [ key for key in keep if key in cache ]
+
+def pack(path, cache, roots = None, keys = None, codec = None):
+	"""Append entries of cache to pack file. Returns count of added entries.
+
+	Serialized entries are copied as is if cache supports it (see DirCache.raw),
+	else values are serialized by codec (None - plain pickle).
+	"""
+	raw = getattr(cache, "raw", None)
+	with PackWriter(path) as writer:
+		for key in selected(cache, roots, keys):
+			if key in writer:
+				continue
+			writer.add(key, raw(key) if raw is not None else dumps_entry(cache[key], codec))
+		return writer.added
+
+def unpack(path, cache):
+	"""Copy all entries of pack file to cache. Returns count of entries.
+	Serialized entries are stored as is if cache supports it (see DirCache.putraw)."""
+	source = PackCache(path)
+	putraw = getattr(cache, "putraw", None)
+	try:
+		keys = source.keys()
+		for key in keys:
+			if putraw is not None:
+				putraw(key, source.raw(key))
+			else:
+				cache[key] = source[key]
+		return len(keys)
+	finally:
+		source.close()
+
+def main(argv = None):
+	from evalcache.dircache import DirCache
+
+	parser = argparse.ArgumentParser(prog = "evalcache", description = "evalcache pack files tool")
+	commands = parser.add_subparsers(dest = "command", required = True)
+	command = commands.add_parser("pack", help = "append DirCache entries to pack")
+	command.add_argument("packpath")
+	command.add_argument("dirpath")
+	command.add_argument("--keys", help = "file with keys to pack, one per line (default all entries)")
+	command = commands.add_parser("unpack", help = "copy pack entries to DirCache")
+	command.add_argument("packpath")
+	command.add_argument("dirpath")
+	command = commands.add_parser("list", help = "print keys of pack")
+	command.add_argument("packpath")
+	args = parser.parse_args(argv)
+
+	if args.command == "pack":
+		keys = None
+		if args.keys:
+			with open(args.keys) as fl:
+				keys = [ line.strip() for line in fl if line.strip() ]
+		print("packed", pack(args.packpath, DirCache(args.dirpath), keys = keys), file = sys.stderr)
+	elif args.command == "unpack":
+		print("unpacked", unpack(args.packpath, DirCache(args.dirpath)), file = sys.stderr)
+	else:
+		cache = PackCache(args.packpath)
+		for key in cache.keys():
+			print(key)
+		cache.close()
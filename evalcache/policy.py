@@ -0,0 +1,108 @@
+#coding: utf-8
+
+import os
+import json
+import atexit
+import tempfile
+import threading
+
+from evalcache.lazy import genericname, pickled_size
+
+class AdaptivePolicy:
+	"""Cache-or-recompute policy driven by measured costs.
+
+	Policy records evaluation time, cache store/load latency and serialized size for every
+	generic function (by qualname). If mean evaluation of a generic is cheaper than cache I/O,
+	its nodes are neither stored nor searched in cache. Until 'samples' evaluations are recorded
+	nodes are cached as usual.
+
+	Statistics can be stored in JSON file, so decisions persist across runs. File is saved on exit
+	and after every 'interval' records.
+
+	lazy = evalcache.Lazy(cache, policy = evalcache.AdaptivePolicy(".evalcache-policy.json"))
+
+	Arguments:
+	----------
+	path -- statistics file path (None - don't persist)
+	samples -- evaluations count before decision
+	factor -- node is cached if mean evaluation time > factor * mean I/O time
+	interval -- records count between statistics saving
+	bandwidth -- cache read throughput in bytes per second for size based I/O estimation
+	"""
+
+	def __init__(self, path = None, samples = 3, factor = 1.0, interval = 1000, bandwidth = 100e6):
+		self.path = path
+		self.samples = samples
+		self.factor = factor
+		self.interval = interval
+		self.bandwidth = bandwidth
+
+		self.mutex = threading.RLock()
+		self.records = 0
+		self.stats = {}
+		self.decisions = {}
+
+		if path is not None:
+			if os.path.exists(path):
+				with open(path) as fl:
+					self.stats = json.load(fl)
+			atexit.register(self.save)
+
+	def entry(self, name):
+		stats = self.stats.get(name)
+		if stats is None:
+			stats = self.stats[name] = {
+				"evals": 0, "eval": 0.0, "stores": 0, "store": 0.0, "loads": 0, "load": 0.0, "sizes": 0, "size": 0
+			}
+		return stats
+
+	def cached(self, obj):
+		"""True if node should be stored in and loaded from cache."""
+		name = genericname(obj)
+		decision = self.decisions.get(name)
+		if decision is None:
+			decision = self.decisions[name] = self.decide(name)
+		return decision
+
+	def decide(self, name):
+		stats = self.stats.get(name)
+		if stats is None or stats["evals"] < self.samples:
+			return True
+		if stats["loads"]:
+			io = stats["load"] / stats["loads"]
+		elif stats["stores"]:
+			io = stats["store"] / stats["stores"]
+		else:
+			return True
+		if stats["sizes"]:
+			io = max(io, stats["size"] / stats["sizes"] / self.bandwidth)
+		return stats["eval"] / stats["evals"] > self.factor * io
+
+	def record(self, obj, event, duration, value = None):
+		"""Record evaluation ("eval"), store ("store") or load ("load") duration in seconds.
+		Serialized size of stored value is sampled for first evaluations (unpicklable values are skipped)."""
+		name = genericname(obj)
+		with self.mutex:
+			stats = self.entry(name)
+			stats[event + "s"] += 1
+			stats[event] += duration
+			if event == "store" and stats["sizes"] < self.samples:
+				size = pickled_size(value)
+				if size is not None:
+					stats["sizes"] += 1
+					stats["size"] += size
+			self.decisions.pop(name, None)
+
+			self.records += 1
+			if self.path is not None and self.records % self.interval == 0:
+				self.save()
+
+	def save(self):
+		"""Store statistics in file atomically."""
+		if self.path is None:
+			return
+		directory = os.path.dirname(os.path.abspath(self.path))
+		fd, tmp = tempfile.mkstemp(dir = directory, prefix = ".", suffix = ".tmp")
+		with self.mutex, os.fdopen(fd, "w") as fl:
+			json.dump(self.stats, fl)
+		os.replace(tmp, self.path)
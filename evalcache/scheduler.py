@@ -0,0 +1,193 @@
+#coding: utf-8
+
+"""Parallel evaluation of lazy trees.
+
+The scheduler walks a lazy tree, builds dependency graph by __lazyhash__ keys
+and dispatches ready nodes to concurrent.futures-like executor (ThreadPoolExecutor
+or ProcessPoolExecutor). Equal subtrees are evaluated once. Results are stored in
+cache by the coordinating thread as each node finishes, so cache object shouldn't be thread-safe.
+"""
+
+import sys
+import time
+import concurrent.futures
+
+from evalcache.lazy import LazyObject, lazyload, lazysave, lazyrelease, lazylock, expand, substitute, dependencies
+
+## Interval of retrying locked by other processes keys (seconds).
+POLL = 0.05
+
+class FunctionReference:
+	"""Picklable reference to a lazy decorated function.
+
+	Decorated function is shadowed by LazyObject in its module, so pickle can't
+	store it by name. We send module and qualname and resolve the function in worker process.
+	"""
+
+	def __init__(self, module, qualname):
+		self.module = module
+		self.qualname = qualname
+
+	def resolve(self):
+		obj = sys.modules[self.module]
+		for name in self.qualname.split("."):
+			obj = getattr(obj, name)
+		if isinstance(obj, LazyObject):
+			return obj.__lazyvalue__
+		return getattr(obj, "__wrapped__", obj)
+
+def invoke(func, args, kwargs):
+	"""Executor's task. Module level function for pickle compatibility.
+
+	Returns result and evaluation time."""
+	if isinstance(func, FunctionReference):
+		func = func.resolve()
+	start = time.perf_counter()
+	value = func(*args, **kwargs)
+	return value, time.perf_counter() - start
+
+def is_local(func, executor):
+	"""Lambdas and closures can't be pickled, so we evaluate them in coordinating process."""
+	if not isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+		return False
+	return "<" in getattr(func, "__qualname__", "<")
+
+def picklable(func):
+	"""Replace shadowed by LazyObject (or by other wrapper with __wrapped__ attribute) 
+	function with FunctionReference."""
+	module = sys.modules.get(getattr(func, "__module__", None))
+	if module is None:
+		return func
+
+	obj = module
+	for name in func.__qualname__.split("."):
+		obj = getattr(obj, name, None)
+	if isinstance(obj, LazyObject):
+		if obj.__lazyvalue__ is func:
+			return FunctionReference(func.__module__, func.__qualname__)
+	elif obj is not func and getattr(obj, "__wrapped__", None) is func:
+		return FunctionReference(func.__module__, func.__qualname__)
+	return func
+
+def unlazy_parallel(root, executor):
+	"""Get a result of evaluation using executor for independent nodes.
+
+	Arguments:
+	----------
+	root -- LazyObject for evaluation
+	executor -- concurrent.futures-like executor
+
+	Disclamer:
+	Generics which returns LazyObjects are supported. Returned tree is evaluated by
+	coordinating thread with the same executor.
+	"""
+	nodes = {}  # hash -> list of LazyObject instances with this hash (first evaluates)
+	waits = {}  # hash -> count of not evaluated dependencies
+	users = {}  # hash -> list of dependent hashes
+	ready = []
+
+	stack = [root]
+	while stack:
+		obj = stack.pop()
+		key = obj.__lazyhash__
+		if key in nodes:
+			nodes[key].append(obj)
+			continue
+		nodes[key] = [obj]
+		if lazyload(obj):
+			continue
+
+		children = dependencies(obj)
+		deps = set(o.__lazyhash__ for o in children if o.__lazyvalue__ is None)
+		waits[key] = len(deps)
+		for dep in deps:
+			users.setdefault(dep, []).append(key)
+		if not deps:
+			ready.append(key)
+		stack.extend(children)
+
+	# Hashes which was loaded on walking stage are already evaluated.
+	for key, instances in nodes.items():
+		if key not in waits:
+			done(key, nodes, waits, users, ready)
+
+	running = {}
+	locks = {}
+	contended = []  # hashes of ready nodes whose keys are locked by other processes
+	try:
+		while ready or running or contended:
+			ready.extend(contended)
+			del contended[:]
+			while ready:
+				key = ready.pop()
+				obj = nodes[key][0]
+
+				# Cross-process single-flight (see lazy.lazycompute). Coordinator must not wait
+				# for a key while it holds locks of running nodes, else two processes which
+				# evaluate shared nodes in different order deadlock. So it waits only if it holds nothing.
+				lock = lazylock(obj)
+				if lock is not None:
+					if not lock.acquire(blocking = not running):
+						contended.append(key)
+						continue
+					locks[key] = lock
+					if lazyload(obj):
+						locks.pop(key).release()
+						done(key, nodes, waits, users, ready)
+						continue
+
+				running[submit(obj, executor)] = key
+
+			if not running:
+				continue
+
+			finished, _ = concurrent.futures.wait(running, timeout = POLL if contended else None,
+				return_when = concurrent.futures.FIRST_COMPLETED)
+			for future in finished:
+				key = running.pop(future)
+				obj = nodes[key][0]
+				value, cost = future.result()
+				lazysave(obj, expand(value, executor), cost)
+				if key in locks:
+					locks.pop(key).release()
+				done(key, nodes, waits, users, ready)
+	finally:
+		for future in running:
+			future.cancel()
+		for lock in locks.values():
+			lock.release()
+
+	value = root.__lazyvalue__
+	for instances in nodes.values():
+		for obj in instances:
+			lazyrelease(obj)
+	return value
+
+def submit(obj, executor):
+	func = substitute(obj.generic)
+	args = substitute(obj.args)
+	kwargs = substitute(obj.kwargs)
+
+	if not is_local(func, executor):
+		if isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+			func = picklable(func)
+		return executor.submit(invoke, func, args, kwargs)
+
+	future = concurrent.futures.Future()
+	try:
+		future.set_result(invoke(func, args, kwargs))
+	except Exception as ex:
+		future.set_exception(ex)
+	return future
+
+def done(key, nodes, waits, users, ready):
+	"""Share the value between equal nodes and release dependent nodes."""
+	value = nodes[key][0].__lazyvalue__
+	for obj in nodes[key][1:]:
+		obj.__lazyvalue__ = value
+
+	for user in users.pop(key, ()):
+		if user in waits:
+			waits[user] -= 1
+			if waits[user] == 0:
+				ready.append(user)
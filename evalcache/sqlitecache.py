@@ -0,0 +1,135 @@
+#coding: utf-8
+
+import sqlite3
+import threading
+import contextlib
+
+from evalcache.codec import dumps_entry, loads_entry
+
+class SqliteCache:
+	"""Dict-like object that store pairs key-value in single sqlite3 database file.
+
+	Database works in WAL mode, so many readers and one writer can share it.
+	Writes inside batch() context are buffered and committed in one short transaction
+	on exit or after every 'flushsize' rows, so database isn't locked during evaluation
+	and interrupted pass keeps flushed results. unlazy uses it for the whole evaluation pass.
+
+	Arguments:
+	----------
+	path - database file path.
+	timeout - seconds to wait for database lock.
+	codec - entries serializer (see evalcache.codec, BufferCodec isn't supported). None - plain pickle.
+	flushsize - count of buffered rows which are committed inside batch.
+	"""
+
+	chunk = 500
+
+	def __init__(self, path, timeout = 60, codec = None, flushsize = 1000):
+		self.path = path
+		self.codec = codec
+		self.flushsize = flushsize
+		self.mutex = threading.RLock()
+		self.depth = 0
+		# Buffered rows of batch: key -> serialized entry.
+		self.pending = {}
+
+		self.connection = sqlite3.connect(path, timeout = timeout, check_same_thread = False,
+			isolation_level = None)
+		self.connection.execute("PRAGMA journal_mode=WAL")
+		self.connection.execute("PRAGMA synchronous=NORMAL")
+		self.connection.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+
+	@contextlib.contextmanager
+	def batch(self):
+		"""Buffer writes and commit them at once. Nested batches are joined to outer."""
+		with self.mutex:
+			self.depth += 1
+		try:
+			yield self
+		finally:
+			with self.mutex:
+				self.depth -= 1
+				if self.depth == 0:
+					self.flush()
+
+	def flush(self):
+		"""Commit buffered rows in one transaction."""
+		with self.mutex:
+			if not self.pending:
+				return
+			rows = list(self.pending.items())
+			self.connection.execute("BEGIN IMMEDIATE")
+			try:
+				self.connection.executemany("INSERT OR REPLACE INTO entries (key, value) VALUES (?, ?)", rows)
+			except BaseException:
+				self.connection.execute("ROLLBACK")
+				raise
+			self.connection.execute("COMMIT")
+			self.pending.clear()
+
+	def __contains__(self, key):
+		with self.mutex:
+			if key in self.pending:
+				return True
+			cursor = self.connection.execute("SELECT 1 FROM entries WHERE key = ?", (key,))
+			return cursor.fetchone() is not None
+
+	def __getitem__(self, key):
+		with self.mutex:
+			data = self.pending.get(key)
+			if data is None:
+				cursor = self.connection.execute("SELECT value FROM entries WHERE key = ?", (key,))
+				row = cursor.fetchone()
+				if row is None:
+					raise KeyError(key)
+				data = row[0]
+		return loads_entry(data)
+
+	def __setitem__(self, key, value):
+		self.put_many([(key, value)])
+
+	def __delitem__(self, key):
+		with self.mutex:
+			found = self.pending.pop(key, None) is not None
+			cursor = self.connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+		if cursor.rowcount == 0 and not found:
+			raise KeyError(key)
+
+	def __len__(self):
+		return len(self.keys())
+
+	def keys(self):
+		with self.mutex:
+			keys = [ row[0] for row in self.connection.execute("SELECT key FROM entries") ]
+			stored = set(keys)
+			return keys + [ key for key in self.pending if key not in stored ]
+
+	def get_many(self, keys):
+		"""Load values for many keys. Returns dict with found pairs only."""
+		keys = list(keys)
+		result = {}
+		with self.mutex:
+			for key in keys:
+				if key in self.pending:
+					result[key] = loads_entry(self.pending[key])
+			keys = [ key for key in keys if key not in result ]
+			for i in range(0, len(keys), self.chunk):
+				part = keys[i : i + self.chunk]
+				cursor = self.connection.execute(
+					"SELECT key, value FROM entries WHERE key IN ({})".format(",".join("?" * len(part))), part)
+				for key, value in cursor:
+					result[key] = loads_entry(value)
+		return result
+
+	def put_many(self, items):
+		"""Store many pairs key-value in one transaction (or buffer them inside batch)."""
+		rows = [ (key, dumps_entry(value, self.codec)) for key, value in items ]
+		with self.mutex:
+			self.pending.update(rows)
+			if self.depth == 0 or len(self.pending) >= self.flushsize:
+				self.flush()
+
+	def close(self):
+		with self.mutex:
+			self.flush()
+			self.connection.close()
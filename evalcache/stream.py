@@ -0,0 +1,121 @@
+#coding: utf-8
+
+"""Streaming lazy nodes.
+
+Result of stream node is a Stream - iterable, which caches generator's output in chunks
+as it is consumed. Stored chunks are replayed from cache without recomputing. If iteration
+was interrupted, generator is resumed after the last stored chunk (resumable generator
+takes 'start' keyword argument, others are restarted and already stored items are skipped).
+
+Chunks are stored with keys "<node's hash>.<index>". Key "<node's hash>.end" stores chunks count
+of completed stream.
+"""
+
+import itertools
+
+from evalcache.lazy import LazyObject
+
+class StreamFunction:
+	"""Lazy stream decorator's result. Call constructs stream node.
+
+	Arguments:
+	----------
+	lazifier -- parental lazy decorator
+	func -- generator function
+	chunksize -- items count per chunk
+	resumable -- func takes 'start' keyword argument (index of the first item)
+	"""
+
+	def __init__(self, lazifier, func, chunksize, resumable):
+		self.lazifier = lazifier
+		self.generic = lazifier(func)
+		self.chunksize = chunksize
+		self.resumable = resumable
+
+	def __call__(self, *args, **kwargs):
+		streamer = Streamer(self.lazifier, self.chunksize, self.resumable)
+		node = LazyObject(self.lazifier, streamer, (self.generic, args, kwargs), encache = False, decache = False)
+		streamer.key = node.__lazyhexhash__
+		return node
+
+class Streamer:
+	"""Generic of stream node."""
+
+	def __init__(self, lazifier, chunksize, resumable):
+		self.lazifier = lazifier
+		self.chunksize = chunksize
+		self.resumable = resumable
+		self.key = None
+
+	def __evalcache_hash__(self, m):
+		m.update(b"evalcache.stream")
+
+	def __call__(self, func, args, kwargs):
+		lazifier = self.lazifier
+		return Stream(lazifier.cache, self.key, func, args, kwargs, self.chunksize, self.resumable,
+			lazifier.encache, lazifier.decache)
+
+class Stream:
+	"""Iterable result of stream node. Every iteration replays cached chunks and continues generation."""
+
+	def __init__(self, cache, key, func, args, kwargs, chunksize, resumable, encache = True, decache = True):
+		self.cache = cache
+		self.key = key
+		self.func = func
+		self.args = args
+		self.kwargs = kwargs
+		self.chunksize = chunksize
+		self.resumable = resumable
+		self.encache = encache
+		self.decache = decache
+
+	def chunkkey(self, index):
+		return "{}.{}".format(self.key, index)
+
+	def complete(self):
+		"""True if the whole stream is stored in cache."""
+		return self.key + ".end" in self.cache
+
+	def __iter__(self):
+		cache = self.cache
+		end = self.key + ".end"
+		total = cache[end] if self.decache and end in cache else None
+
+		# Stored chunks can have other size (chunksize isn't hashed), so items are counted.
+		index = 0
+		start = 0
+		while self.decache and (total is None or index < total):
+			key = self.chunkkey(index)
+			if key not in cache:
+				break
+			for item in cache[key]:
+				start += 1
+				yield item
+			index += 1
+
+		if total is not None:
+			return
+
+		if self.resumable:
+			generator = iter(self.func(*self.args, start = start, **self.kwargs))
+		else:
+			generator = itertools.islice(self.func(*self.args, **self.kwargs), start, None)
+
+		chunk = []
+		for item in generator:
+			chunk.append(item)
+			yield item
+			if len(chunk) == self.chunksize:
+				self.store(index, chunk)
+				index += 1
+				chunk = []
+
+		if chunk:
+			self.store(index, chunk)
+			index += 1
+		if self.encache:
+			cache[end] = index
+
+	def store(self, index, chunk):
+		if self.encache:
+			self.cache[self.chunkkey(index)] = chunk
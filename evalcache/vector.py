@@ -0,0 +1,128 @@
+#coding: utf-8
+
+"""Batched lazy map over collections.
+
+lazy.map(func, iterable) constructs one lazy node for the whole collection. Every element
+has its own cache key, the same as key of func(element) node, but cache lookups and stores
+are batched (see SqliteCache.get_many/put_many), and only missing elements are computed in chunks.
+"""
+
+import concurrent.futures
+
+from evalcache.lazy import LazyObject, cachebatch
+from evalcache.hashing import updatehash
+from evalcache.scheduler import FunctionReference, picklable
+
+class Vectorized:
+	"""Batched function wrapper for lazy.map. Function takes list of elements and returns list of results.
+
+	Arguments:
+	----------
+	lazifier -- parental lazy decorator
+	func -- batched function
+	chunksize -- elements count per call
+	"""
+
+	def __init__(self, lazifier, func, chunksize):
+		self.lazifier = lazifier
+		self.__wrapped__ = func
+		self.chunksize = chunksize
+
+	def __evalcache_hash__(self, m):
+		m.update(b"vectorized")
+		return (self.__wrapped__,)
+
+	def __call__(self, iterable):
+		return self.lazifier.map(self, iterable, chunksize = self.chunksize)
+
+class Mapper:
+	"""Generic of lazy map node. Keys of elements are evaluated on construction.
+
+	Arguments:
+	----------
+	lazifier -- parental lazy decorator
+	keys -- cache keys of elements
+	chunksize -- elements count per chunk
+	executor -- concurrent.futures-like executor for chunks (None - sequential evaluation)
+	"""
+
+	def __init__(self, lazifier, keys, chunksize, executor):
+		self.lazifier = lazifier
+		self.keys = keys
+		self.chunksize = chunksize
+		self.executor = executor
+
+	def __evalcache_hash__(self, m):
+		m.update(b"evalcache.map")
+
+	def __evalcache_keys__(self):
+		"""Keys of elements for gc and pack (see lazy.reachable)."""
+		return self.keys
+
+	def __call__(self, func, elements):
+		lazifier = self.lazifier
+		cache = lazifier.cache
+		keys = self.keys
+
+		found = get_many(cache, keys) if lazifier.decache else {}
+		missing = [ i for i, key in enumerate(keys) if key not in found ]
+		chunks = [ missing[i : i + self.chunksize] for i in range(0, len(missing), self.chunksize) ]
+
+		vectorized = isinstance(func, Vectorized)
+		if vectorized:
+			func = func.__wrapped__
+
+		if self.executor is None:
+			results = ( compute(func, [ elements[i] for i in chunk ], vectorized) for chunk in chunks )
+		else:
+			if isinstance(self.executor, concurrent.futures.ProcessPoolExecutor):
+				func = picklable(func)
+			futures = [ self.executor.submit(compute, func, [ elements[i] for i in chunk ], vectorized)
+				for chunk in chunks ]
+			results = ( future.result() for future in futures )
+
+		for chunk, values in zip(chunks, results):
+			items = [ (keys[i], v) for i, v in zip(chunk, values) ]
+			if lazifier.encache:
+				put_many(cache, items)
+			found.update(items)
+
+		return [ found[key] for key in keys ]
+
+def compute(func, elements, vectorized):
+	"""Executor's task. Module level function for pickle compatibility."""
+	if isinstance(func, FunctionReference):
+		func = func.resolve()
+	if vectorized:
+		return list(func(elements))
+	return [ func(e) for e in elements ]
+
+def get_many(cache, keys):
+	"""Batched cache lookup. Returns dict with found pairs only."""
+	if hasattr(cache, "get_many"):
+		return cache.get_many(keys)
+	return { key : cache[key] for key in keys if key in cache }
+
+def put_many(cache, items):
+	"""Batched cache store."""
+	if hasattr(cache, "put_many"):
+		cache.put_many(items)
+		return
+	with cachebatch(cache):
+		for key, value in items:
+			cache[key] = value
+
+def lazymap(lazifier, func, iterable, chunksize = 1024, executor = None):
+	"""Construct lazy collection node (see Lazy.map)."""
+	generic = func if isinstance(func, LazyObject) else lazifier(func)
+	elements = list(iterable)
+
+	keys = []
+	for element in elements:
+		m = lazifier.algo()
+		updatehash(m, generic)
+		updatehash(m, (element,))
+		keys.append(m.hexdigest())
+
+	mapper = Mapper(lazifier, keys, chunksize, executor)
+	return LazyObject(lazifier, mapper, (generic, elements), encache = False, decache = False)
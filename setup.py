@@ -15,4 +15,5 @@ setup(
 	license='MIT',
 	url = 'https://github.com/mirmik/evalcache',
 	keywords = ['caching', 'lazy'],
+	entry_points = { 'console_scripts': ['evalcache = evalcache.__main__:main'] },
 )
\ No newline at end of file
@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import time
+import asyncio
+import evalcache
+
+lazy = evalcache.Lazy(cache = evalcache.DirCache(".evalcache"), decache = False)
+calls = []
+
+@lazy
+async def fetch(a):
+	calls.append(a)
+	await asyncio.sleep(0.2)
+	return a
+
+@lazy
+def summ(*args):
+	time.sleep(0.2)
+	return sum(args)
+
+async def main():
+	tree = summ(fetch(1), fetch(2), fetch(3))
+
+	start = time.time()
+	results = await asyncio.gather(tree.aunlazy(), evalcache.aunlazy(summ(fetch(1), fetch(2), fetch(3))))
+	elapsed = time.time() - start
+
+	print(results) #[6, 6]
+	assert results == [6, 6]
+	assert sorted(calls) == [1, 2, 3] # shared in-flight evaluation
+	assert elapsed < 0.6
+
+asyncio.run(main())
+
+# Results are expanded as in unlazy: tuples become lists whichever path stores the key.
+@lazy
+def pair():
+	return (1, 2)
+
+async def paired():
+	return await pair().aunlazy()
+
+assert asyncio.run(paired()) == pair().unlazy() == [1, 2]
+
+# Policy and hooks are consulted.
+from evalcache.lazy import genericname
+
+class Rejecting:
+	def __init__(self):
+		self.events = []
+	def cached(self, obj):
+		return genericname(obj) != "rejected"
+	def record(self, obj, event, duration, value = None):
+		self.events.append((genericname(obj), event))
+
+policy = Rejecting()
+events = []
+store = {}
+plain = evalcache.Lazy(cache = store, policy = policy, hooks = [ events.append ])
+
+@plain
+def rejected(a):
+	return a
+
+@plain
+def accepted(a):
+	return a
+
+async def policed():
+	return await asyncio.gather(rejected(1).aunlazy(), accepted(2).aunlazy())
+
+assert asyncio.run(policed()) == [1, 2]
+assert list(store) == [ accepted(2).__lazyhexhash__ ]
+assert ("rejected", "eval") in policy.events and ("rejected", "store") not in policy.events
+evaluated = [ (e["name"], e["event"]) for e in events if e["event"] != "hash" ]
+assert [ e for n, e in evaluated if n == "accepted" ] == ["lookup", "eval", "store"]
+assert [ e for n, e in evaluated if n == "rejected" ] == ["eval"]
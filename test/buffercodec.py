@@ -0,0 +1,37 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import os
+import pickle
+import shutil
+import evalcache
+
+cache = evalcache.DirCache(".evalcache", codec = evalcache.BufferCodec())
+
+cache["buffer"] = pickle.PickleBuffer(bytearray(b"x" * 100000))
+value = cache["buffer"]
+assert isinstance(value, memoryview) and value.readonly # zero-copy view of mapped file
+assert bytes(value) == b"x" * 100000
+
+cache["object"] = {"a" : 1, "b" : bytearray(b"y" * 100)}
+assert cache["object"] == {"a" : 1, "b" : bytearray(b"y" * 100)}
+# Reader doesn't depend on writer's alignment, also in pack file.
+shutil.rmtree(".evalcache-align", ignore_errors = True)
+if os.path.exists(".evalcache-align.pack"):
+	os.remove(".evalcache-align.pack")
+aligned = evalcache.DirCache(".evalcache-align", codec = evalcache.BufferCodec(align = 4096))
+aligned["buffer"] = pickle.PickleBuffer(bytearray(b"z" * 10000))
+aligned["other"] = pickle.PickleBuffer(bytearray(b"w" * 100))
+assert bytes(evalcache.DirCache(".evalcache-align")["buffer"]) == b"z" * 10000
+
+from evalcache.pack import pack
+pack(".evalcache-align.pack", aligned)
+packed = evalcache.PackCache(".evalcache-align.pack")
+assert bytes(packed["buffer"]) == b"z" * 10000
+assert bytes(packed["other"]) == b"w" * 100
+packed.close()
+shutil.rmtree(".evalcache-align")
+os.remove(".evalcache-align.pack")
+print("OK")
@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import time
+import evalcache
+
+class SlowCache(dict):
+	def __setitem__(self, key, value):
+		time.sleep(0.05)
+		dict.__setitem__(self, key, value)
+
+memory = evalcache.MemoryCache()
+disk = evalcache.DirCache(".evalcache")
+shared = SlowCache()
+cache = evalcache.ChainCache([memory, disk, shared], writeback = True)
+lazy = evalcache.Lazy(cache = cache)
+
+@lazy
+def square(x):
+	return x * x
+
+# Slow tiers don't block unlazy.
+start = time.time()
+assert [ square(i).unlazy() for i in range(10) ] == [ i * i for i in range(10) ]
+assert time.time() - start < 0.25
+key = square(3).__lazyhexhash__
+assert key in memory
+
+cache.flush()
+assert key in disk and shared[key] == 9
+
+# Promotion into faster tiers.
+memory.clear()
+for k in list(disk.keys()):
+	del disk[k]
+assert evalcache.Lazy(cache = cache)(square.__lazyvalue__)(3).unlazy() == 9
+assert key in memory and key in disk
+
+# Batched lookup with promotion.
+memory.clear()
+found = cache.get_many([ square(i).__lazyhexhash__ for i in range(12) ])
+assert len(found) == 10 and key in memory
+
+stats = cache.stats()
+print(stats)
+assert [ s["tier"] for s in stats ] == ["MemoryCache", "DirCache", "SlowCache"]
+assert stats[2]["hits"] == 10 and stats[1]["hits"] == 1
+
+# A value in the slowest tier is read with one lookup per tier: contains, get.
+class CountingCache(dict):
+	def __init__(self):
+		self.calls = []
+	def __contains__(self, key):
+		self.calls.append("contains")
+		return dict.__contains__(self, key)
+	def __getitem__(self, key):
+		self.calls.append("get")
+		return dict.__getitem__(self, key)
+
+memory = evalcache.MemoryCache()
+remote = CountingCache()
+cache = evalcache.ChainCache([memory, remote])
+lazy = evalcache.Lazy(cache = cache)
+@lazy
+def cube(x):
+	return x * x * x
+
+remote[cube(2).__lazyhexhash__] = 8
+assert cube(2).unlazy() == 8
+assert remote.calls == ["contains", "get"], remote.calls
+assert memory.misses == 1 and cache.stats()[1]["hits"] == 1
+
+# Direct reading without __contains__.
+remote.calls.clear()
+memory.clear()
+assert cache[cube(2).__lazyhexhash__] == 8 and remote.calls == ["get"]
+try:
+	cache["missing"]
+	assert False
+except KeyError:
+	pass
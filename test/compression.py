@@ -0,0 +1,32 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import os
+import evalcache
+
+cache = evalcache.DirCache(".evalcache")
+zcache = evalcache.DirCache(".evalcache", codec = evalcache.ZlibCodec())
+xcache = evalcache.DirCache(".evalcache", codec = evalcache.LzmaCodec(adaptive = False))
+
+text = "compressible " * 10000
+
+cache["plain0001"] = text
+zcache["zlib0001"] = text
+xcache["lzma0001"] = text
+zcache["small0001"] = "small"
+zcache["random0001"] = os.urandom(10000)
+
+assert os.path.getsize(zcache.find("zlib0001")) < os.path.getsize(cache.find("plain0001")) / 10
+assert open(zcache.find("small0001"), "rb").read(4) == b"EVC\0" # adaptive mode: stored as plain pickle
+assert open(zcache.find("random0001"), "rb").read(4) == b"EVC\0"
+
+# Any cache instance reads any entry.
+for key in ["plain0001", "zlib0001", "lzma0001"]:
+	assert cache[key] == zcache[key] == text
+
+sqlite = evalcache.SqliteCache(".evalcache.sqlite", codec = evalcache.ZlibCodec())
+sqlite["text"] = text
+assert sqlite["text"] == text
+print("OK")
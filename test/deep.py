@@ -0,0 +1,14 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import evalcache
+lazy = evalcache.Lazy(cache = {})
+
+x = lazy(0)
+for i in range(100000):
+	x = x + 1
+
+print(x.unlazy()) #100000
+assert x.unlazy() == 100000
@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import os
+import evalcache
+
+for path in (".evalcache.sqlite", ".evalcache-index.sqlite"):
+	for suffix in ("", "-wal", "-shm"):
+		if os.path.exists(path + suffix):
+			os.remove(path + suffix)
+
+cache = evalcache.SqliteCache(".evalcache.sqlite")
+index = evalcache.DependencyIndex(".evalcache-index.sqlite")
+lazy = evalcache.Lazy(cache = cache, index = index)
+calls = []
+
+@lazy
+def add(a, b):
+	calls.append((a, b))
+	return a + b
+
+@lazy
+def mul(a, b):
+	calls.append((a, b))
+	return a * b
+
+a = lazy(2)
+b = lazy(3)
+c = lazy(4)
+x = add(a, b)
+y = mul(x, c)
+z = add(c, 1)
+assert y.unlazy() == 20
+assert z.unlazy() == 5
+
+assert index.name(y) == "mul"
+assert index.children(y) == { x.__lazyhexhash__, c.__lazyhexhash__, mul.__lazyhexhash__ }
+assert index.affected([a]) == { x.__lazyhexhash__, y.__lazyhexhash__ }
+assert index.affected([c]) == { y.__lazyhexhash__, z.__lazyhexhash__ }
+
+# Changed endpoint invalidates only its dependants.
+removed = index.invalidate(cache, [a])
+assert sorted(removed) == sorted([ x.__lazyhexhash__, y.__lazyhexhash__ ])
+assert z.__lazyhexhash__ in cache
+
+# Prefetch loads the cached part of a new tree by batched reads.
+class Counting(dict):
+	requests = 0
+	def __contains__(self, key):
+		Counting.requests += 1
+		return dict.__contains__(self, key)
+	def get_many(self, keys):
+		Counting.requests += 1
+		return { key : self[key] for key in keys if dict.__contains__(self, key) }
+
+counting = evalcache.Lazy(cache = Counting())
+wide = counting(sum)([ counting(pow)(i, 2) for i in range(100) ])
+wide.unlazy()
+wide = counting(sum)([ counting(pow)(i, 2) for i in range(101) ])
+Counting.requests = 0
+assert evalcache.prefetch([wide]) == 100
+assert Counting.requests <= 4
+
+w = add(mul(add(c, 1), 2), mul(lazy(5), 5))
+assert evalcache.prefetch([w]) == 1
+del calls[:]
+assert w.unlazy() == 35
+assert sorted(calls) == [(5, 2), (5, 5), (10, 25)]
+# Index isn't locked while batched evaluation is running.
+other = evalcache.DependencyIndex(".evalcache-index.sqlite", timeout = 1)
+with index.batch():
+	lazy(pow)(2, 10).unlazy()
+	evalcache.Lazy(cache = {}, index = other)(pow)(3, 3).unlazy()
+assert index.name(lazy(pow)(2, 10)) == "pow" and other.name(lazy(pow)(2, 10)) == "pow"
+other.close()
+print(len(cache), "entries")
@@ -0,0 +1,25 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import os
+import pickle
+import evalcache
+
+cache = evalcache.DirCache(".evalcache")
+
+cache["abcdef0123"] = 42
+assert os.path.exists(os.path.join(".evalcache", "ab", "cd", "abcdef0123"))
+assert "abcdef0123" in cache
+assert cache["abcdef0123"] == 42
+assert "abcdef0124" not in cache
+
+# Early versions flat layout.
+with open(os.path.join(".evalcache", "fedcba9876"), "wb") as fl:
+	pickle.dump("flat", fl)
+assert cache["fedcba9876"] == "flat"
+
+# No temporary files are left.
+assert os.listdir(os.path.join(".evalcache", "ab", "cd")) == ["abcdef0123"]
+print("OK")
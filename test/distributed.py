@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import os
+import time
+import multiprocessing
+import evalcache
+
+cache = evalcache.DirCache(".evalcache")
+lazy = evalcache.Lazy(cache = cache)
+
+@lazy
+def step(trace, i):
+	time.sleep(0.01)
+	return trace + [(i, os.getpid())]
+
+@lazy
+def slow(x):
+	time.sleep(0.3)
+	return os.getpid()
+
+@lazy
+def collect(*args):
+	return list(args)
+
+@lazy
+def fragile(marker):
+	# The first worker dies without reply.
+	if not os.path.exists(marker):
+		open(marker, "w").close()
+		os._exit(1)
+	return os.getpid()
+
+if __name__ == "__main__":
+	multiprocessing.set_start_method("fork")
+	cluster = evalcache.Cluster(("localhost", 0)).start()
+	workers = [ multiprocessing.Process(target = evalcache.run_worker, args = (cluster.address, evalcache.DirCache(".evalcache")))
+		for _ in range(3) ]
+	for w in workers:
+		w.start()
+	assert cluster.wait(3, timeout = 10)
+
+	# Independent nodes are evaluated by different workers.
+	start = time.time()
+	pids = cluster.unlazy(collect(slow(1), slow(2), slow(3)))
+	assert time.time() - start < 0.8
+	assert len(set(pids)) == 3 and os.getpid() not in pids
+	assert slow(2).__lazyhexhash__ in cache
+
+	# Chain is evaluated by the worker, which holds previous value.
+	trace = step(step(step(step([], 0), 1), 2), 3)
+	result = evalcache.Lazy(cache = cache, executor = cluster)(step.__lazyvalue__)(trace, 4).unlazy()
+	assert [ i for i, _ in result ] == [0, 1, 2, 3, 4]
+	assert len(set(pid for _, pid in result)) == 1
+
+	# Operator nodes are evaluated by coordinator, cached results are reused.
+	value = (lazy(10) + slow(1)).unlazy(executor = cluster)
+	assert value == 10 + pids[0]
+
+	cluster.close()
+	for w in workers:
+		w.join(5)
+		assert not w.is_alive()
+
+	# Task of dead worker is sent to other worker.
+	if os.path.exists(".evalcache/fragile"):
+		os.remove(".evalcache/fragile")
+	if fragile(".evalcache/fragile").__lazyhexhash__ in cache:
+		del cache[fragile(".evalcache/fragile").__lazyhexhash__]
+	cluster = evalcache.Cluster(("localhost", 0), timeout = 1).start()
+	workers = [ multiprocessing.Process(target = evalcache.run_worker, 
+		args = (cluster.address, evalcache.DirCache(".evalcache")), kwargs = { "heartbeat": 0.2 }) for _ in range(2) ]
+	for w in workers:
+		w.start()
+	assert cluster.wait(2, timeout = 10)
+	pid = cluster.unlazy(fragile(".evalcache/fragile"))
+	assert pid in [ w.pid for w in workers ]
+	assert len(cluster.workers()) == 1
+	cluster.close(timeout = 1)
+	for w in workers:
+		w.join(5)
+		assert not w.is_alive()
+	print("OK")
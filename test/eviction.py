@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import os
+import time
+import shutil
+import evalcache
+
+shutil.rmtree(".evalcache-eviction", ignore_errors = True)
+cache = evalcache.DirCache(".evalcache-eviction", policy = "cost")
+lazy = evalcache.Lazy(cache = cache)
+
+@lazy
+def cheap(a):
+	return a
+
+@lazy
+def expensive(a):
+	time.sleep(0.1)
+	return a
+
+roots = [cheap(i) for i in range(5)] + [expensive(i) for i in range(5)]
+for r in roots:
+	r.unlazy()
+assert len(cache.keys()) == 10
+
+# Cheap nodes are evicted first.
+removed = cache.evict(maxcount = 5)
+assert sorted(removed) == sorted(r.__lazyhexhash__ for r in roots[:5])
+
+# Only entries of current trees are kept.
+removed = cache.gc(roots = [expensive(0)])
+assert cache.keys() == [expensive(0).__lazyhexhash__]
+del cache[expensive(0).__lazyhexhash__]
+assert cache.keys() == []
+
+# Costs are logged for "cost" policy only, eviction compacts the log.
+for r in roots * 2:
+	cache.setcost(r.__lazyhexhash__, 0.5)
+with open(".evalcache-eviction/.costs") as fl:
+	assert len(fl.readlines()) > 20
+cache.evict(maxcount = 10)
+with open(".evalcache-eviction/.costs") as fl:
+	assert len(fl.readlines()) == 10
+shutil.rmtree(".evalcache-eviction")
+
+lru = evalcache.Lazy(cache = evalcache.DirCache(".evalcache-eviction"))
+lru(expensive.__lazyvalue__)(1).unlazy()
+assert not os.path.exists(".evalcache-eviction/.costs")
+
+shutil.rmtree(".evalcache-eviction")
+
+# Budgeted cache keeps the most expensive entries, just written entry isn't evicted before its cost is recorded.
+budget = evalcache.DirCache(".evalcache-eviction", policy = "cost", maxcount = 4)
+lazy = evalcache.Lazy(cache = budget)
+
+@lazy
+def costly(i):
+	time.sleep(0.02 * i)
+	return i
+
+nodes = [ costly(i) for i in range(1, 9) ]
+for node in nodes:
+	node.unlazy()
+assert sorted(budget.keys()) == sorted(node.__lazyhexhash__ for node in nodes[4:])
+
+shutil.rmtree(".evalcache-eviction")
+print("OK")
@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import pickle
+import evalcache
+
+cache = {}
+lazy = evalcache.Lazy(cache = cache, fuse = True)
+
+a = lazy(2)
+b = lazy(3)
+c = lazy(4)
+d = lazy(5)
+
+# Operator chain is one node, its arguments are leaves.
+x = (a * b + c) / d
+assert x.generic.source == "(((_0 * _1) + _2) / _3)"
+assert list(x.args) == [a, b, c, d]
+assert x.unlazy() == 2.0
+assert list(cache) == [x.__lazyhexhash__]
+
+# Shared leaves and constants.
+y = -(a * a) + 1 + abs(b - 10)
+assert y.unlazy() == 4
+assert y.args[0] is a and y.args[1] == 1
+
+# Formula's hash doesn't depend on construction order.
+ab = a * b
+assert (ab + c).__lazyhexhash__ == (a * b + c).__lazyhexhash__
+
+# Lazy functions results are leaves.
+@lazy
+def vector(n):
+	return list(range(n))
+
+z = vector(10)[b] * 2
+assert z.unlazy() == 6
+assert pickle.loads(pickle.dumps(z.generic))([1, 2, 3], 1, 5) == 10
+
+# Not fused lazifier keeps node per operator.
+plain = evalcache.Lazy(cache = {})
+w = (plain(2) * 3 + 4) / 5
+assert not isinstance(w.generic, evalcache.fusion.Expression)
+assert w.unlazy() == 2.0
+
+# Long chains are split into expression nodes of bounded depth.
+x = lazy(0)
+for i in range(1000):
+	x = x + 1
+assert x.generic.depth <= evalcache.fusion.MAXDEPTH
+assert x.unlazy() == 1000
+assert len(evalcache.fusion.compiled) <= evalcache.fusion.compiled_size
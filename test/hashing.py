@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import array
+import ctypes
+import subprocess
+import evalcache
+import evalcache.hashing
+lazy = evalcache.Lazy(cache = {})
+
+class Point:
+	def __init__(self, x, y):
+		self.x, self.y = x, y
+
+	def __evalcache_hash__(self, m):
+		return (self.x, self.y)
+
+class Vector:
+	pass
+
+evalcache.register_hash(Vector, lambda m, obj: m.update(b"Vector"))
+
+assert lazy(Point(1, 2)) == lazy(Point(1, 2))
+assert lazy(Point(1, 2)) != lazy(Point(2, 1))
+assert lazy(Vector()) == lazy(Vector())
+
+# Buffers are hashed by data, not by representation.
+a = array.array("d", range(100000))
+b = array.array("d", range(100000))
+b[50000] = -1
+assert lazy(a) != lazy(b)
+assert lazy(bytearray(a)) != lazy(a)
+
+# Buffers of objects are hashed by elements, not by pointers, so keys are stable between runs.
+objects = "import sys, ctypes; sys.path.insert(0, '..'); import evalcache; " \
+	"print(evalcache.Lazy(cache = {})((ctypes.py_object * 2)('a', (1, 2))).__lazyhexhash__)"
+runs = [ subprocess.check_output([sys.executable, "-c", objects]) for _ in range(2) ]
+assert runs[0] == runs[1]
+assert lazy((ctypes.py_object * 2)("a", (1, 2))) != lazy((ctypes.py_object * 2)("a", (1, 3)))
+
+# Large immutable values aren't kept alive by hashes memo.
+lazy(bytes(10 ** 6))
+assert all(len(value) <= evalcache.hashing.endpoints_memo_maxlen 
+	for value, _ in evalcache.hashing.endpoints_memo.values() if isinstance(value, bytes))
+
+# Deep nested containers are hashed without recursion.
+deep = []
+for i in range(100000):
+	deep = [deep, i]
+lazy(deep)
+print("OK")
@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import shutil
+import threading
+import evalcache
+
+for path in (".evalcache-server", ".evalcache-first", ".evalcache-second"):
+	shutil.rmtree(path, ignore_errors = True)
+
+server = evalcache.CacheServer(".evalcache-server", ("localhost", 0))
+threading.Thread(target = server.serve_forever, daemon = True).start()
+
+calls = []
+
+def worker(name):
+	cache = evalcache.HttpCache(server.url, local = evalcache.DirCache(".evalcache-" + name))
+	return evalcache.Lazy(cache = cache)
+
+def square(x):
+	calls.append(x)
+	return x * x
+
+# Result computed by one worker is shared with another.
+first = worker("first")
+assert first(square)(4).unlazy() == 16
+second = worker("second")
+assert second(square)(4).unlazy() == 16
+assert calls == [4]
+
+# Server's directory is a DirCache.
+assert first(square)(4).__lazyhexhash__ in evalcache.DirCache(".evalcache-server")
+
+# Batched lookup.
+result = first.map(square, range(10), chunksize = 3).unlazy()
+assert result == [ x * x for x in range(10) ]
+cache = evalcache.HttpCache(server.url)
+keys = [ first(square)(x).__lazyhexhash__ for x in range(12) ]
+found = cache.get_many(keys)
+assert len(found) == 10 and found[keys[3]] == 9
+
+# Pooled connections are kept alive.
+for x in range(100):
+	assert keys[0] in cache
+assert cache.pool.qsize() == 1
+
+del cache[keys[0]]
+assert keys[0] not in cache
+cache.close()
+server.shutdown()
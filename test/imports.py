@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import hashlib
+import warnings
+
+import evalcache
+
+# Backends are imported on first access.
+assert "evalcache.httpcache" not in sys.modules
+assert "evalcache.distributed" not in sys.modules
+assert "asyncio" not in sys.modules
+assert "HttpCache" in dir(evalcache)
+lazy = evalcache.Lazy(cache = {})
+assert "evalcache.httpcache" not in sys.modules
+evalcache.HttpCache
+assert "evalcache.httpcache" in sys.modules
+
+# Function's hash is evaluated at decoration time. Default hash doesn't depend on code.
+def func(a):
+	return a + 1
+default = lazy(func)
+m = hashlib.sha256()
+evalcache.updatehash(m, func)
+assert default.__lazyhash__ == m.digest()
+
+def func(a):
+	return a + 2
+assert lazy(func) == default
+
+# With codehash editing of function changes its hash.
+coded = evalcache.Lazy(cache = {}, codehash = True)
+def func(a):
+	return a + 1
+first = coded(func)
+def func(a):
+	return a + 2
+assert coded(func) != first
+assert coded(func) != default
+
+# Default arguments are hashed too.
+def scaled(a, scale = 2, *, shift = 0):
+	return a * scale + shift
+first = coded(scaled)
+def scaled(a, scale = 3, *, shift = 0):
+	return a * scale + shift
+assert coded(scaled) != first
+def scaled(a, scale = 3, *, shift = 1):
+	return a * scale + shift
+second = coded(scaled)
+assert second != first and coded(scaled) == second
+
+# Warnings are emitted once per definition site.
+with warnings.catch_warnings(record = True) as caught:
+	warnings.simplefilter("always")
+	for i in range(3):
+		lazy(lambda x: x)
+
+	class A:
+		pass
+	lazy(A())
+	lazy(A())
+
+messages = [ w for w in caught if issubclass(w.category, evalcache.EvalcacheWarning) ]
+assert len(messages) == 2, messages
+assert messages[0].filename == __file__
+print("OK")
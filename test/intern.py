@@ -0,0 +1,41 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import gc
+import pickle
+import evalcache
+
+lazy = evalcache.Lazy(cache = {}, encache = False, decache = False, intern = True)
+calls = []
+
+@lazy
+def add(a, b):
+	calls.append((a, b))
+	return a + b
+
+a = lazy(1)
+b = lazy(2)
+
+# Common subexpressions are the same node.
+x = add(a, b) * 3
+y = add(lazy(1), lazy(2)) * 3
+assert x is y
+assert add(a, b) is add(a, b)
+assert (x + y).unlazy() == 18
+assert calls == [(1, 2)]
+
+# Table doesn't pin nodes.
+count = len(lazy.nodes)
+del x, y
+gc.collect()
+assert len(lazy.nodes) < count
+
+# Nodes with other cache flags are not merged.
+assert a.real is not add(a, b)
+assert evalcache.Lazy(cache = {}).nodes is None
+
+# Nodes are still picklable.
+copy = pickle.loads(pickle.dumps(lazy(5), pickle.HIGHEST_PROTOCOL))
+assert copy.__lazyvalue__ == 5
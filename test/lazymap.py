@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import os
+import evalcache
+
+for path in (".evalcache.sqlite", ".evalcache.sqlite-wal", ".evalcache.sqlite-shm"):
+	if os.path.exists(path):
+		os.remove(path)
+
+cache = evalcache.SqliteCache(".evalcache.sqlite")
+lazy = evalcache.Lazy(cache = cache)
+calls = []
+
+@lazy
+def square(x):
+	calls.append(x)
+	return x * x
+
+@lazy.vectorize(chunksize = 3)
+def cube(xs):
+	calls.append(len(xs))
+	return [ x ** 3 for x in xs ]
+
+# Element keys are the same as keys of single nodes.
+square(3).unlazy()
+del calls[:]
+
+result = lazy.map(square, range(10), chunksize = 4).unlazy()
+print(result)
+assert result == [ x * x for x in range(10) ]
+assert sorted(calls) == [0, 1, 2, 4, 5, 6, 7, 8, 9]
+assert square(5).__lazyhexhash__ in cache
+
+# Partial cache hits.
+del calls[:]
+assert lazy.map(square, range(12)).unlazy() == [ x * x for x in range(12) ]
+assert calls == [10, 11]
+
+del calls[:]
+assert cube([lazy(1), 2, 3, 4]).unlazy() == [1, 8, 27, 64]
+assert calls == [3, 1]
+
+# Elements are reachable from map node, so gc and pack keep them.
+import shutil
+import evalcache.pack
+shutil.rmtree(".evalcache-map", ignore_errors = True)
+if os.path.exists(".evalcache-map.pack"):
+	os.remove(".evalcache-map.pack")
+dircache = evalcache.DirCache(".evalcache-map")
+mapped = evalcache.Lazy(cache = dircache).map(square.__lazyvalue__, range(5))
+mapped.unlazy()
+assert len(dircache.keys()) == 5
+assert evalcache.pack.pack(".evalcache-map.pack", dircache, roots = [mapped]) == 5
+assert dircache.gc([mapped]) == []
+assert len(dircache.keys()) == 5
+shutil.rmtree(".evalcache-map")
+os.remove(".evalcache-map.pack")
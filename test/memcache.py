@@ -0,0 +1,38 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import evalcache
+
+memory = evalcache.MemoryCache(maxsize = 1000)
+cache = evalcache.TieredCache(memory, evalcache.DirCache(".evalcache"))
+lazy = evalcache.Lazy(cache = cache, keepvalue = False)
+
+@lazy
+def blob(n):
+	return "a" * n
+
+a = blob(400)
+b = blob(500)
+c = blob(600)
+
+a.unlazy()
+b.unlazy()
+assert a.__lazyvalue__ is None
+assert a.__lazyhexhash__ in memory and b.__lazyhexhash__ in memory
+
+c.unlazy() # evicts a and b
+assert a.__lazyhexhash__ not in memory
+assert memory.size <= memory.maxsize
+
+assert a.unlazy() == "a" * 400 # promoted from DirCache
+assert a.__lazyhexhash__ in memory
+print(memory.stats())
+
+# Without bytes budget values aren't sized, so unpicklable values are kept.
+unbounded = evalcache.MemoryCache(maxcount = 10)
+unbounded["closure"] = lambda: 1
+assert unbounded["closure"]() == 1 and unbounded.size == 0
+memory["closure"] = lambda: 1
+assert "closure" not in memory
@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import os
+import shutil
+import evalcache
+import evalcache.pack
+
+shutil.rmtree(".evalcache", ignore_errors = True)
+for path in (".evalcache.pack", ".evalcache.list"):
+	if os.path.exists(path):
+		os.remove(path)
+
+cache = evalcache.DirCache(".evalcache")
+lazy = evalcache.Lazy(cache = cache)
+calls = []
+
+@lazy
+def square(x):
+	calls.append(x)
+	return x * x
+
+@lazy
+def total(xs):
+	return sum(xs)
+
+root = total([ square(i) for i in range(10) ])
+other = square(100)
+assert root.unlazy() == 285
+other.unlazy()
+cache[square(5).__lazyhexhash__ + "x"] = "junk"
+
+# Reachable entries only.
+assert evalcache.pack.pack(".evalcache.pack", cache, roots = [root]) == 11
+packed = evalcache.PackCache(".evalcache.pack")
+assert len(packed) == 11
+assert root.__lazyhexhash__ in packed and other.__lazyhexhash__ not in packed
+assert packed[square(3).__lazyhexhash__] == 9
+
+# Appending keeps old entries.
+assert evalcache.pack.pack(".evalcache.pack", cache, roots = [root, other]) == 1
+packed = evalcache.PackCache(".evalcache.pack")
+assert len(packed) == 12 and packed[other.__lazyhexhash__] == 10000
+
+# Warm start from pack.
+del calls[:]
+warm = evalcache.Lazy(cache = packed)
+assert warm(square.__lazyvalue__)(100).unlazy() == 10000
+assert calls == []
+
+# Unpack to new directory keeps serialized entries as is.
+assert evalcache.pack.unpack(".evalcache.pack", evalcache.DirCache(".evalcache-unpacked")) == 12
+unpacked = evalcache.DirCache(".evalcache-unpacked")
+assert unpacked.raw(root.__lazyhexhash__) == cache.raw(root.__lazyhexhash__)
+
+# Command line tool.
+assert os.system("cd .. && {} -m evalcache list test/.evalcache.pack > test/.evalcache.list".format(sys.executable)) == 0
+with open(".evalcache.list") as fl:
+	assert sorted(fl.read().split()) == sorted(packed.keys())
@@ -0,0 +1,44 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import time
+import evalcache
+import concurrent.futures
+
+lazy = evalcache.Lazy(cache = {})
+
+@lazy
+def slow(a):
+	time.sleep(0.2)
+	return a
+
+@lazy
+def summ(*args):
+	return sum(args)
+
+shared = slow(1)
+tree = summ(shared, slow(2) + shared, slow(3), slow(4))
+
+with concurrent.futures.ThreadPoolExecutor(8) as executor:
+	start = time.time()
+	result = evalcache.unlazy(tree, executor = executor)
+	elapsed = time.time() - start
+
+print(result) #11
+assert result == 11
+assert elapsed < 0.6
+assert tree.__lazyhexhash__ in lazy.cache
+
+# Decorated functions are sent to worker processes by reference.
+@lazy
+def square(a, b = 0):
+	return a * a + b
+
+if __name__ == "__main__":
+	tree = summ(square(2), square(3, b = 1), square(slow(4)))
+	with concurrent.futures.ProcessPoolExecutor(2) as executor:
+		result = evalcache.unlazy(tree, executor = executor)
+	print(result) #30
+	assert result == 30
@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import os
+import time
+import evalcache
+
+if os.path.exists(".evalcache-policy.json"):
+	os.remove(".evalcache-policy.json")
+
+cache = evalcache.DirCache(".evalcache")
+policy = evalcache.AdaptivePolicy(".evalcache-policy.json")
+lazy = evalcache.Lazy(cache = cache, policy = policy)
+
+@lazy
+def slow(a):
+	time.sleep(0.02)
+	return a
+
+x = lazy(0)
+for i in range(10):
+	x = x + slow(i)
+print(x.unlazy()) #45
+
+# Trivial arithmetic nodes are cheaper than DirCache I/O.
+assert not policy.decide("LazyObject.__add__.<locals>.<lambda>")
+assert policy.decide("slow")
+
+last = x + 1
+last.unlazy()
+assert last.__lazyhexhash__ not in cache
+
+# Decisions persist across runs.
+policy.save()
+assert not evalcache.AdaptivePolicy(".evalcache-policy.json").decide("LazyObject.__add__.<locals>.<lambda>")
+
+# Big values are estimated by their size, unpicklable values don't break recording.
+memory = evalcache.AdaptivePolicy(bandwidth = 1e6)
+lazy = evalcache.Lazy(cache = {}, policy = memory)
+
+@lazy
+def big(i):
+	return bytes(10 ** 6) + bytes([i])
+
+@lazy
+def closure(a):
+	return lambda: a
+
+for i in range(5):
+	big(i).unlazy()
+	assert closure(i).unlazy()() == i
+assert not memory.decide("big")
+assert memory.stats["closure"]["sizes"] == 0
@@ -0,0 +1,39 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import time
+import json
+import evalcache
+
+profiler = evalcache.Profiler()
+lazy = evalcache.Lazy(cache = {}, hooks = [profiler])
+
+@lazy
+def slow(a):
+	time.sleep(0.05)
+	return a
+
+tree = slow(1) + slow(2)
+tree.unlazy()
+slow(1).unlazy()
+
+report = profiler.report()
+assert report["slow"]["evals"] == 2
+assert report["slow"]["eval"] >= 0.1
+assert report["slow"]["hits"] == 1 and report["slow"]["loads"] == 1
+assert report["slow"]["stores"] == 2 and report["slow"]["size"] > 0
+assert report["slow"]["recommend"] == "cache"
+
+profiler.print_report()
+json.loads(profiler.to_json())
+assert len(profiler.chrome_trace()["traceEvents"]) == len(profiler.events)
+
+# Observing doesn't change behaviour: unpicklable values are reported without size.
+@lazy
+def closure(a):
+	return lambda: a
+
+assert closure(3).unlazy()() == 3
+assert profiler.report()["closure"]["stores"] == 1
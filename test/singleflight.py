@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import os
+import time
+import shutil
+import multiprocessing
+import concurrent.futures
+import evalcache
+
+lazy = evalcache.Lazy(cache = evalcache.DirCache(".evalcache-singleflight"))
+
+@lazy
+def expensive(a):
+	with open(".evalcache-singleflight/calls", "a") as fl:
+		fl.write("call\n")
+	time.sleep(0.5)
+	return a * 2
+
+@lazy
+def slow(a):
+	time.sleep(1)
+	return a
+
+@lazy
+def summ(*args):
+	return sum(args)
+
+@lazy
+def foo():
+	time.sleep(0.3)
+	return 42
+
+@lazy
+def bar():
+	return foo()
+
+def worker(_):
+	return expensive(21).unlazy()
+
+def crossed(order):
+	# Shared nodes in opposite order. Coordinator mustn't wait for a key while it holds other keys.
+	with concurrent.futures.ThreadPoolExecutor(1) as executor:
+		return evalcache.unlazy(summ(*[ slow(a) for a in order ]), executor = executor)
+
+if __name__ == "__main__":
+	shutil.rmtree(".evalcache-singleflight", ignore_errors = True)
+	os.mkdir(".evalcache-singleflight")
+
+	with multiprocessing.Pool(4) as pool:
+		results = pool.map(worker, range(4))
+
+	with open(".evalcache-singleflight/calls") as fl:
+		calls = fl.read().count("call")
+
+	print(results, calls) #[42, 42, 42, 42] 1
+	assert results == [42] * 4
+	assert calls == 1
+
+	# Returned lazy node is in flight: nested unlazy reenters key's lock held by this process.
+	with concurrent.futures.ThreadPoolExecutor(2) as executor:
+		assert evalcache.unlazy(summ(bar(), foo()), executor = executor) == 84
+
+	with multiprocessing.Pool(2) as pool:
+		result = pool.map_async(crossed, [(1, 2), (2, 1)])
+		assert result.get(timeout = 15) == [3, 3]
+	shutil.rmtree(".evalcache-singleflight")
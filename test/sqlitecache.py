@@ -0,0 +1,38 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import os
+import evalcache
+
+for path in (".evalcache.sqlite", ".evalcache.sqlite-wal", ".evalcache.sqlite-shm"):
+	if os.path.exists(path):
+		os.remove(path)
+
+cache = evalcache.SqliteCache(".evalcache.sqlite")
+lazy = evalcache.Lazy(cache = cache)
+
+@lazy
+def summ(*args):
+	return sum(args)
+
+tree = lazy(0)
+for i in range(100):
+	tree = summ(tree, i)
+
+print(tree.unlazy()) #4950
+assert tree.__lazyhexhash__ in cache
+
+cache.put_many([("a", 1), ("b", 2)])
+assert cache.get_many(["a", "b", "c"]) == {"a": 1, "b": 2}
+
+# Database isn't locked while batched evaluation is running.
+other = evalcache.SqliteCache(".evalcache.sqlite", timeout = 1)
+with cache.batch():
+	cache["c"] = 3
+	assert "c" in cache and cache.get_many(["c"]) == {"c": 3}
+	other["d"] = 4
+	assert "c" not in other
+assert other["c"] == 3
+other.close()
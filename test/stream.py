@@ -0,0 +1,65 @@
+#!/usr/bin/python3
+
+import sys
+sys.path.insert(0, "..")
+
+import evalcache
+
+cache = evalcache.DirCache(".evalcache")
+lazy = evalcache.Lazy(cache = cache)
+produced = []
+
+@lazy.stream(chunksize = 4)
+def numbers(n):
+	for i in range(n):
+		produced.append(i)
+		yield i
+
+@lazy.stream(chunksize = 4, resumable = True)
+def squares(n, start = 0):
+	for i in range(start, n):
+		produced.append(i)
+		yield i * i
+
+# Interrupted consumption stores complete chunks only.
+stream = numbers(10).unlazy()
+for i in stream:
+	if i == 6:
+		break
+assert not stream.complete()
+
+# Restarted generator skips stored items.
+del produced[:]
+assert list(numbers(10).unlazy()) == list(range(10))
+assert produced == list(range(10))
+assert numbers(10).unlazy().complete()
+
+# Replay from cache.
+del produced[:]
+assert list(numbers(10).unlazy()) == list(range(10))
+assert produced == []
+
+# Resumable generator starts from the first missing chunk.
+for i in squares(10).unlazy():
+	if i == 25:
+		break
+del produced[:]
+assert list(squares(10).unlazy()) == [ i * i for i in range(10) ]
+assert produced == [4, 5, 6, 7, 8, 9]
+
+# Changed chunksize resumes after the last stored item.
+@lazy.stream(chunksize = 4, resumable = True)
+def counter(n, start = 0):
+	return iter(range(start, n))
+
+for i in counter(12).unlazy():
+	if i == 5:
+		break
+counter = lazy.stream(counter.generic.__lazyvalue__, chunksize = 3, resumable = True)
+assert list(counter(12).unlazy()) == list(range(12))
+assert list(counter(12).unlazy()) == list(range(12))
+
+# Chunks are kept by gc with their node.
+cache.gc([numbers(10)])
+assert list(cache.keys()) and all(key.startswith(numbers(10).__lazyhexhash__) for key in cache.keys())
+print(sorted(cache.keys()))